@@ -125,6 +125,8 @@ STATIC_URL = '/static/'
 
 MEDIA_URL = '/media/'
 
+SUBSCRIPTION_DISPATCH = os.environ.get("SUBSCRIPTION_DISPATCH", "sync")
+
 CELERY_BROKER_URL = "redis://redis:6379"
 
 CELERY_RESULT_BACKEND = "redis://redis:6379"
@@ -134,4 +136,16 @@ CELERY_BEAT_SCHEDULE = {
         "task": "sample.tasks.dummy_task",
         "schedule": crontab(minute="*/1"),
     },
+    "advance_events": {
+        "task": "subscription.tasks.advance_events",
+        "schedule": crontab(minute="*/1"),
+    },
+    "fire_events": {
+        "task": "subscription.tasks.fire_events",
+        "schedule": crontab(minute="*/1"),
+    },
+    "drain_dispatches": {
+        "task": "subscription.tasks.drain_dispatches",
+        "schedule": crontab(minute="*/1"),
+    },
 }
@@ -5,8 +5,25 @@ from django.contrib.messages import constants
 from django.db.models import QuerySet
 
 from .managers import SubscriptionQuerySet, ResourceQuerySet
-from .models import Subscription, SubscriptionLine, SubscriptionEvent, Resource
+from .models import Subscription, SubscriptionLine, SubscriptionEvent, Resource, ResourceDispatch
+from .routing import resource_index
 from .signals import callback_receiver
+from .wiring import signal_wiring
+
+
+def related_content_types(queryset: QuerySet) -> QuerySet:
+    """
+    Returns the ids of the content types related to the resources in
+    queryset, or to the resources of the subscriptions in queryset.
+
+    :param queryset:
+    :return:
+    """
+    if queryset.model is Subscription:
+        queryset = Resource.objects.filter(
+            subscription_event__subscription_line__subscription__in=queryset
+        )
+    return queryset.values_list('content_type_id', flat=True).distinct()
 
 
 def activate(
@@ -15,8 +32,8 @@ def activate(
         queryset: QuerySet
 ):
     queryset.update(active=True)
-    model = queryset.model
-    model.objects.connect(model.signal, model.receiver, model)
+    resource_index.invalidate()
+    signal_wiring.refresh(related_content_types(queryset))
     modeladmin.message_user(request, _('Total activated: %s' % queryset.count()))
 
 
@@ -29,8 +46,8 @@ def deactivate(
         queryset: QuerySet
 ):
     queryset.update(active=False)
-    model = queryset.model
-    model.objects.disconnect(model.signal, model.receiver, model)
+    resource_index.invalidate()
+    signal_wiring.refresh(related_content_types(queryset))
     modeladmin.message_user(request, _('Total deactivated: %s' % queryset.count()))
 
 
@@ -62,10 +79,8 @@ def connect(
 
     for instance in queryset:
 
-        receiver = instance.__class__.receiver
-        signal = instance.__class__.signal
         model_class = instance.content_type.model_class()
-        signal.connect(receiver, sender=model_class)
+        signal_wiring.connect(model_class)
 
     modeladmin.message_user(request, _('Done!'))
 
@@ -81,11 +96,9 @@ def disconnect(
 
     for instance in queryset:
 
-        receiver = instance.__class__.receiver
-        signal = instance.__class__.signal
         model_class = instance.content_type.model_class()
 
-        if not signal.disconnect(receiver, sender=model_class):
+        if not signal_wiring.disconnect(model_class):
             modeladmin.message_user(
                 request,
                 _('Unable to disconnect: %s' % model_class),
@@ -135,8 +148,10 @@ class SubscriptionLineAdmin(admin.ModelAdmin):
 @admin.register(SubscriptionEvent)
 class SubscriptionEventAdmin(admin.ModelAdmin):
     date_hierarchy = 'start'
-    list_display = ('id', 'start', 'end', 'recurrence', 'subscription_line')
-    list_filter = ('start', 'end',)
+    list_display = (
+        'id', 'start', 'end', 'recurrence', 'next_start', 'next_end', 'fired_start', 'subscription_line'
+    )
+    list_filter = ('start', 'end', 'next_start')
     fieldsets = (
         (None, {
             'fields': ('start', 'end', 'recurrence', 'subscription_line')
@@ -162,3 +177,11 @@ class ResourceAdmin(admin.ModelAdmin):
         }),
     )
     actions = (activate, deactivate, run_callback, connect, disconnect,)
+
+
+@admin.register(ResourceDispatch)
+class ResourceDispatchAdmin(admin.ModelAdmin):
+    date_hierarchy = 'created_at'
+    list_display = ('id', 'resource', 'object_created', 'attempts', 'available_at', 'created_at')
+    list_filter = ('available_at', 'attempts')
+    readonly_fields = ('resource', 'object_created', 'attempts', 'last_error', 'created_at')
@@ -1,27 +1,192 @@
+from typing import Iterable, List, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import ModelViewSet
 
+from .bulk import deferred_routing
+from .importers import BulkImporter, CSV, DEFAULT_BATCH_SIZE, NDJSON
 from .models import Subscription, SubscriptionLine, SubscriptionEvent, Resource
+from .pagination import IdCursorPagination, StartCursorPagination
+from .renderers import NDJSONRenderer
 from .serializers import (
     SubscriptionSerializer, SubscriptionLineSerializer, SubscriptionEventSerializer,
     ResourceSerializer
 )
 
 
-class SubscriptionViewSet(ModelViewSet):
+class RelatedQuerysetMixin:
+    """
+    Loads the relations in select_related and prefetch_related along
+    with the objects of the viewset, so that serializing any number of
+    them takes a constant number of queries. Generic related objects are
+    prefetched with one query per content type.
+    """
+    select_related: Tuple[str, ...] = ()
+    prefetch_related: Tuple[str, ...] = ()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        return queryset.prefetch_related(*self.prefetch_related)
+
+    def load_related(self, instances: List) -> None:
+        """
+        Loads the relations of instances that were not read with the
+        queryset of the viewset, such as newly created ones.
+
+        :param instances:
+        :return:
+        """
+        prefetch_related_objects(instances, *self.select_related, *self.prefetch_related)
+
+
+class StreamingListMixin:
+    """
+    Streams the whole list as NDJSON when it is requested, with the
+    application/x-ndjson media type or ?format=ndjson, instead of
+    paginating it. The objects are read with iterator() in chunks of
+    chunk_size, prefetching the relations of each chunk, and serialized
+    one at a time, so the memory used does not depend on the size of
+    the table.
+    """
+    chunk_size = 1000
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer, NDJSONRenderer):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is not None:
+            queryset = queryset.order_by(*self.paginator.get_ordering(request, queryset, self))
+
+        serializer = self.get_serializer()
+        return StreamingHttpResponse(
+            request.accepted_renderer.stream(
+                serializer.to_representation(instance)
+                for instance in queryset.iterator(chunk_size=self.chunk_size)
+            ),
+            content_type=NDJSONRenderer.media_type
+        )
+
+
+class BulkImportMixin:
+    """
+    Adds an import action that reads NDJSON, or CSV if the content type
+    is text/csv, from the request body as it is streamed, and returns
+    the summary of the import with the errors of each rejected row.
+    """
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request, *args, **kwargs):
+        format = CSV if request.content_type.startswith('text/csv') else NDJSON
+        try:
+            batch_size = int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE))
+        except ValueError:
+            batch_size = DEFAULT_BATCH_SIZE
+
+        stream = request.stream or []
+        result = BulkImporter(self.get_queryset().model, batch_size).run(
+            (line.decode('utf-8') for line in stream), format
+        )
+        return Response(result.as_dict())
+
+
+class BulkWriteMixin:
+    """
+    Adds actions on the bulk list route that validate a batch of objects
+    as a whole and write it in a single transaction: POST creates, PATCH
+    partially updates (each item with its id) and DELETE deletes (a list
+    of ids).
+    """
+    def get_pks(self, values: Iterable) -> List:
+        """
+        Returns the values that are valid primary keys of the model of
+        the viewset.
+
+        :param values:
+        :return:
+        """
+        pk_field = self.get_queryset().model._meta.pk
+        pks = []
+        for value in values:
+            try:
+                pks.append(pk_field.to_python(value))
+            except (ValidationError, TypeError):
+                pass
+        return pks
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.load_related(serializer.instance)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @bulk_create.mapping.patch
+    def bulk_partial_update(self, request, *args, **kwargs):
+        items = request.data if isinstance(request.data, list) else []
+        pks = self.get_pks(item.get('id') for item in items if isinstance(item, dict))
+        instances = {
+            str(instance.pk): instance
+            for instance in self.get_queryset().filter(pk__in=pks)
+        }
+        serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.load_related(serializer.instance)
+        return Response(serializer.data)
+
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise serializers.ValidationError('Expected a list of ids.')
+
+        with transaction.atomic(), deferred_routing():
+            self.get_queryset().filter(pk__in=self.get_pks(request.data)).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SubscriptionViewSet(
+    RelatedQuerysetMixin, StreamingListMixin, BulkImportMixin, BulkWriteMixin, ModelViewSet
+):
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
+    pagination_class = IdCursorPagination
+    prefetch_related = ('content_object',)
 
 
-class SubscriptionLineViewSet(ModelViewSet):
+class SubscriptionLineViewSet(
+    RelatedQuerysetMixin, StreamingListMixin, BulkImportMixin, BulkWriteMixin, ModelViewSet
+):
     queryset = SubscriptionLine.objects.all()
     serializer_class = SubscriptionLineSerializer
+    pagination_class = IdCursorPagination
+    select_related = ('subscription',)
 
 
-class SubscriptionEventViewSet(ModelViewSet):
+class SubscriptionEventViewSet(
+    RelatedQuerysetMixin, StreamingListMixin, BulkImportMixin, BulkWriteMixin, ModelViewSet
+):
     queryset = SubscriptionEvent.objects.all()
     serializer_class = SubscriptionEventSerializer
+    pagination_class = StartCursorPagination
+    select_related = ('subscription_line__subscription',)
 
 
-class ResourceViewSet(ModelViewSet):
+class ResourceViewSet(
+    RelatedQuerysetMixin, StreamingListMixin, BulkImportMixin, BulkWriteMixin, ModelViewSet
+):
     queryset = Resource.objects.all()
     serializer_class = ResourceSerializer
+    pagination_class = IdCursorPagination
+    select_related = ('subscription_event__subscription_line__subscription',)
+    prefetch_related = ('content_object',)
@@ -6,3 +6,4 @@ class SubscriptionConfig(AppConfig):
 
     def ready(self):
         import subscription.signals
+        import subscription.wiring
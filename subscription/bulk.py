@@ -0,0 +1,152 @@
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Type
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.db.models import prefetch_related_objects
+
+_deferred = threading.local()
+
+
+def load_content_objects(resources: List[models.Model]) -> None:
+    """
+    Loads the related objects of the resources, along with their
+    many-to-many values, with a query per content type and relation,
+    unless they are already loaded.
+
+    :param resources:
+    :return:
+    """
+    prefetch_related_objects(resources, 'content_object')
+
+    objects = {}
+    for resource in resources:
+        if resource.content_object is not None:
+            objects.setdefault(type(resource.content_object), []).append(resource.content_object)
+    for model_class, instances in objects.items():
+        prefetch_related_objects(
+            instances, *[field.name for field in model_class._meta.many_to_many]
+        )
+
+
+def prepare(instances: List[models.Model]) -> None:
+    """
+    Sets the values that save() sets, as bulk_create and bulk_update do
+    not call it: the next occurrence of events and the values of the
+    related object of resources.
+
+    :param instances:
+    :return:
+    """
+    from .models import Resource, SubscriptionEvent
+
+    resources = [instance for instance in instances if isinstance(instance, Resource)]
+    if resources:
+        load_content_objects(resources)
+
+    for instance in instances:
+        if isinstance(instance, SubscriptionEvent):
+            instance.update_next_occurrence()
+        elif isinstance(instance, Resource):
+            instance.content_object_fields = instance.get_values_from_related_object(
+                ContentType.objects.get_for_id(instance.content_type_id).model_class()
+            )
+
+
+def bulk_saved(
+        model_class: Type[models.Model],
+        instances: List[models.Model],
+        created: bool = False,
+        content_type_ids: Iterable[int] = ()
+) -> None:
+    """
+    Does once for a batch of instances written with bulk_create or
+    bulk_update what the post_save receivers do for each instance: the
+    resource index is invalidated and the signal wiring refreshed, with
+    the content types of the resources and content_type_ids, which
+    holds the ones they had before an update. The events of updated
+    lines get their next occurrence recomputed, as save() does. The
+    resources watching the instances, if any, are notified.
+
+    :param model_class:
+    :param instances:
+    :param created:
+    :param content_type_ids:
+    :return:
+    """
+    from .models import Resource, Subscription, SubscriptionEvent, SubscriptionLine
+    from .routing import resource_index
+    from .signals import notify_objects
+    from .wiring import signal_wiring
+
+    if not instances:
+        return
+
+    if issubclass(model_class, (Resource, Subscription)):
+        resource_index.invalidate()
+
+    if issubclass(model_class, Resource):
+        signal_wiring.refresh(
+            {instance.content_type_id for instance in instances} | set(content_type_ids)
+        )
+    elif issubclass(model_class, Subscription) and not created and signal_wiring.loaded:
+        signal_wiring.refresh(
+            Resource.objects.filter(
+                subscription_event__subscription_line__subscription__in=instances
+            ).values_list('content_type_id', flat=True).distinct()
+        )
+
+    if issubclass(model_class, SubscriptionLine) and not created:
+        SubscriptionEvent.objects.filter(subscription_line__in=instances).recompute()
+
+    if signal_wiring.watches(model_class):
+        notify_objects(model_class, [instance.pk for instance in instances], created=created)
+
+
+@contextmanager
+def deferred_routing() -> Iterator[None]:
+    """
+    Makes the post_save and post_delete receivers of resources and
+    subscriptions record what they would do instead of doing it, so a
+    bulk delete, whose cascade sends those signals for every row, only
+    invalidates the resource index and refreshes the signal wiring once
+    for all the content types involved when the block succeeds.
+
+    :return:
+    """
+    from .routing import resource_index
+    from .wiring import signal_wiring
+
+    if getattr(_deferred, 'state', None) is not None:
+        yield
+        return
+
+    state = _deferred.state = {'invalidate': False, 'content_type_ids': set()}
+    try:
+        yield
+    finally:
+        _deferred.state = None
+
+    if state['invalidate']:
+        resource_index.invalidate()
+    signal_wiring.refresh(state['content_type_ids'])
+
+
+def defer_routing(content_type_id: Optional[int] = None) -> bool:
+    """
+    Records that the resource index must be invalidated and, if given,
+    that the signal wiring must be refreshed for content_type_id, when
+    called within deferred_routing.
+
+    :param content_type_id:
+    :return: whether the work was deferred
+    """
+    state = getattr(_deferred, 'state', None)
+    if state is None:
+        return False
+
+    state['invalidate'] = True
+    if content_type_id is not None:
+        state['content_type_ids'].add(content_type_id)
+    return True
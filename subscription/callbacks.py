@@ -0,0 +1,81 @@
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_MAXSIZE = 256
+
+RESOLUTION_ERRORS = (ImportError, TypeError, AttributeError, ValueError)
+
+
+class CallbackRegistry:
+    """
+    Bounded LRU cache of the objects referenced by callback dotted
+    paths. Each path is imported once. Failed imports are counted per
+    path but not cached, so a callback that becomes importable (for
+    instance, once its module is deployed) is resolved on next use.
+    """
+    def __init__(self, maxsize: Optional[int] = None):
+        self.maxsize = maxsize or getattr(
+            settings, 'SUBSCRIPTION_CALLBACK_CACHE_SIZE', DEFAULT_MAXSIZE
+        )
+        self.failures = Counter()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def resolve(self, path: str) -> Any:
+        """
+        Returns the object referenced by path, or raises the error
+        raised when importing it.
+
+        :param path:
+        :return:
+        """
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._entries[path]
+            self.misses += 1
+
+        try:
+            obj = import_string(path)
+        except RESOLUTION_ERRORS:
+            with self._lock:
+                self.failures[path] += 1
+            raise
+
+        with self._lock:
+            self._entries[path] = obj
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return obj
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        Drops the cached object of path, or every cached object if no
+        path is given.
+
+        :param path:
+        :return:
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+callback_registry = CallbackRegistry()
@@ -0,0 +1,202 @@
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 4
+
+
+class CallbackExecutor:
+    """
+    Bounded thread pool that runs independent callbacks concurrently.
+    At most workers + queue_size callbacks are queued or running; when
+    the pool is saturated, callbacks run in the calling thread, which
+    slows down the producer instead of growing the queue. The caller
+    stops waiting for a callback after timeout seconds, although the
+    callback keeps its worker until it returns.
+
+    Counters and latencies are kept to monitor the queue depth and the
+    time callbacks spend waiting and running. Workers have their own
+    database connections and cannot see uncommitted changes, so only
+    callbacks dispatched after commit are submitted to the pool.
+    """
+    def __init__(
+            self,
+            workers: Optional[int] = None,
+            timeout: Optional[float] = None,
+            queue_size: Optional[int] = None
+    ):
+        self.workers = workers if workers is not None else getattr(
+            settings, 'SUBSCRIPTION_CALLBACK_WORKERS', 0
+        )
+        self.timeout = timeout if timeout is not None else getattr(
+            settings, 'SUBSCRIPTION_CALLBACK_TIMEOUT', None
+        )
+        self.queue_size = queue_size if queue_size is not None else getattr(
+            settings, 'SUBSCRIPTION_CALLBACK_QUEUE_SIZE', DEFAULT_QUEUE_SIZE * self.workers
+        )
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.inline = 0
+        self.queued = 0
+        self.running = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+        self.max_run_time = 0.0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size or 1)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='subscription-callback'
+                )
+            return self._executor
+
+    def _release(self, future: Future) -> None:
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+        self._slots.release()
+
+    def _run(self, func: Callable, submitted: float, pooled: bool):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_time += started - submitted
+
+        failed = True
+        try:
+            result = func()
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.running -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                self.run_time += elapsed
+                self.max_run_time = max(self.max_run_time, elapsed)
+            if pooled:
+                close_old_connections()
+
+        return result
+
+    def submit(self, func: Callable) -> Future:
+        """
+        Runs func in the pool, or in the calling thread if the pool is
+        saturated. Returns a future with its result.
+
+        :param func:
+        :return:
+        """
+        with self._lock:
+            self.submitted += 1
+            self.queued += 1
+
+        submitted = time.perf_counter()
+        if self._slots.acquire(blocking=False):
+            try:
+                future = self.executor.submit(self._run, func, submitted, True)
+            except RuntimeError:
+                self._slots.release()
+                raise
+            future.add_done_callback(self._release)
+            return future
+
+        with self._lock:
+            self.inline += 1
+        future = Future()
+        try:
+            future.set_result(self._run(func, submitted, False))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def run(self, funcs: List[Callable]) -> List:
+        """
+        Runs funcs concurrently and waits for each of them for timeout
+        seconds at most, counted from its submission. Returns their
+        results, with None for the ones that timed out, or raises the
+        first error raised by any of them.
+
+        :param funcs:
+        :return:
+        """
+        futures = [
+            (time.perf_counter(), self.submit(func))
+            for func in funcs
+        ]
+
+        results, error = [], None
+        for submitted, future in futures:
+            timeout = None
+            if self.timeout is not None:
+                timeout = max(0.0, submitted + self.timeout - time.perf_counter())
+            try:
+                results.append(future.result(timeout=timeout))
+            except TimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                future.cancel()
+                logger.warning(f'Callback timed out after {self.timeout}s')
+                results.append(None)
+            except Exception as e:
+                error = error or e
+                results.append(None)
+
+        if error is not None:
+            raise error
+
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the counters and the average latencies of the executor.
+        Completed callbacks returned, failed ones raised; the averages
+        cover both.
+
+        :return:
+        """
+        with self._lock:
+            finished = self.completed + self.failed or 1
+            return {
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'inline': self.inline,
+                'queued': self.queued,
+                'running': self.running,
+                'avg_wait_time': self.wait_time / finished,
+                'avg_run_time': self.run_time / finished,
+                'max_run_time': self.max_run_time,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+callback_executor = CallbackExecutor()
@@ -0,0 +1,36 @@
+from django.db import models
+
+
+class Microseconds(models.Func):
+    """
+    Converts a duration expression into an integer number of
+    microseconds. SQLite and MySQL already store durations (and
+    datetime differences) as microseconds, PostgreSQL uses intervals.
+    """
+    template = '%(expressions)s'
+    output_field = models.BigIntegerField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template='(EXTRACT(EPOCH FROM %(expressions)s) * 1000000)::bigint',
+            **extra_context
+        )
+
+
+def elapsed(date, field: str = 'start') -> Microseconds:
+    """
+    Returns the microseconds elapsed between the value of field and
+    date.
+
+    :param date:
+    :param field:
+    :return:
+    """
+    return Microseconds(
+        models.ExpressionWrapper(
+            models.Value(date, output_field=models.DateTimeField()) - models.F(field),
+            output_field=models.DurationField()
+        )
+    )
@@ -0,0 +1,405 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple, Type
+import csv
+import datetime
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import NON_FIELD_ERRORS, ObjectDoesNotExist, ValidationError
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .bulk import bulk_saved, prepare
+
+logger = logging.getLogger(__name__)
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+
+DEFAULT_BATCH_SIZE = 1000
+
+BOOLEANS = {'true': True, 'false': False}
+
+IMPORTABLE_MODELS = {
+    'subscription': 'Subscription',
+    'line': 'SubscriptionLine',
+    'event': 'SubscriptionEvent',
+    'resource': 'Resource',
+}
+
+
+class RowError(NamedTuple):
+    line: int
+    errors: Dict[str, List[str]]
+
+
+class ImportResult:
+    """
+    Summary of an import: the number of created and rejected rows, the
+    errors of each rejected row and the time spent.
+    """
+    def __init__(self):
+        self.created = 0
+        self.errors: List[RowError] = []
+        self.duration = 0.0
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def rate(self) -> float:
+        """
+        Returns the number of rows processed per second.
+
+        :return:
+        """
+        rows = self.created + self.failed
+        return rows / self.duration if self.duration else float(rows)
+
+    def as_dict(self) -> dict:
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'duration': round(self.duration, 3),
+            'rate': round(self.rate, 1),
+            'errors': [error._asdict() for error in self.errors],
+        }
+
+
+def error_dict(error: ValidationError) -> Dict[str, List[str]]:
+    if hasattr(error, 'error_dict'):
+        return error.message_dict
+    return {NON_FIELD_ERRORS: error.messages}
+
+
+class BulkImporter:
+    """
+    Imports rows of field values into the model in chunks of
+    batch_size rows. The related objects of a chunk are loaded with one
+    query per relation, so the rows are validated with the clean rules
+    of the model without querying, and the valid ones are written with
+    bulk_create in a transaction per chunk. Content types can be given
+    by id or as "app_label.model" and are resolved once.
+
+    Resources get the values of their related object stored as save()
+    does, and the signal wiring and resource index are refreshed once
+    per chunk. Events get their next occurrence computed and, if the
+    SUBSCRIPTION_PREVENT_OVERLAP setting is enabled, are checked against
+    an index of the occurrences of their line loaded once per line.
+    """
+    def __init__(
+            self,
+            model_class: Type[models.Model],
+            batch_size: int = DEFAULT_BATCH_SIZE
+    ):
+        self.model_class = model_class
+        self.batch_size = batch_size
+        opts = model_class._meta
+        self.fields = {
+            name: field
+            for field in opts.concrete_fields
+            for name in {field.name, field.attname}
+        }
+        self.foreign_keys = [field for field in opts.concrete_fields if field.many_to_one]
+        self.generic_foreign_key = next(
+            (field for field in opts.private_fields if isinstance(field, GenericForeignKey)),
+            None
+        )
+        self._content_types: Dict[str, int] = {}
+        self._intervals = {}
+
+    def rows(self, stream: Iterable[str], format: str = NDJSON) -> Iterator[Tuple[int, object]]:
+        """
+        Generates the line number and the values of each row of stream,
+        or the ValidationError raised when parsing it.
+
+        :param stream:
+        :param format:
+        :return:
+        """
+        if format == CSV:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+            return
+
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, ValidationError(_(f'Invalid JSON: {e}'))
+                continue
+            if not isinstance(row, dict):
+                yield number, ValidationError(_('Expected a JSON object'))
+                continue
+            yield number, row
+
+    def content_type_id(self, value) -> int:
+        """
+        Returns the id of the content type given by id or natural key.
+
+        :param value:
+        :return:
+        """
+        if isinstance(value, int) or str(value).isdigit():
+            return int(value)
+
+        if value not in self._content_types:
+            try:
+                app_label, model = str(value).lower().split('.', 1)
+                content_type = ContentType.objects.get_by_natural_key(app_label, model)
+            except (ValueError, ObjectDoesNotExist):
+                raise ValidationError(_(f'Unknown content type: "{value}"'))
+            self._content_types[value] = content_type.pk
+
+        return self._content_types[value]
+
+    def build(self, row: dict) -> models.Model:
+        """
+        Returns an unsaved instance with the values of row, converted
+        to the Python type of their field. Empty values of nullable
+        fields are read as null, as CSV has no null value, and naive
+        dates are read in the current time zone if USE_TZ is enabled.
+
+        :param row:
+        :return:
+        """
+        unknown = set(row) - set(self.fields)
+        if unknown:
+            raise ValidationError(_(f'Unknown fields: {unknown}'))
+
+        instance = self.model_class()
+        for name, value in row.items():
+            field = self.fields[name]
+            if value == '' and field.null:
+                value = None
+            if isinstance(field, models.BooleanField) and isinstance(value, str):
+                value = BOOLEANS.get(value.lower(), value)
+            if value is not None:
+                try:
+                    if field.many_to_one and field.related_model is ContentType:
+                        value = self.content_type_id(value)
+                    elif field.many_to_one:
+                        value = field.target_field.to_python(value)
+                    else:
+                        value = field.to_python(value)
+                except ValidationError as e:
+                    raise ValidationError({field.name: e.messages})
+                if isinstance(value, datetime.datetime) and settings.USE_TZ and timezone.is_naive(value):
+                    value = timezone.make_aware(value)
+            setattr(instance, field.attname, value)
+
+        return instance
+
+    def resolve(self, instances: List[models.Model]) -> Dict[int, ValidationError]:
+        """
+        Loads the objects related to the instances, with one query per
+        relation, and caches them in the instances. Returns the errors
+        of the instances whose related objects do not exist, by index.
+
+        :param instances:
+        :return:
+        """
+        errors = {}
+        for field in self.foreign_keys:
+            ids = {getattr(instance, field.attname) for instance in instances} - {None}
+            if field.related_model is ContentType:
+                related = {}
+                for pk in ids:
+                    try:
+                        related[pk] = ContentType.objects.get_for_id(pk)
+                    except ContentType.DoesNotExist:
+                        pass
+            else:
+                queryset = field.related_model._default_manager.all()
+                if field.name == 'subscription_event':
+                    queryset = queryset.select_related('subscription_line')
+                elif field.name == 'subscription_line':
+                    queryset = queryset.select_related('subscription')
+                related = queryset.in_bulk(list(ids))
+
+            for index, instance in enumerate(instances):
+                pk = getattr(instance, field.attname)
+                if pk is None:
+                    continue
+                if pk in related:
+                    setattr(instance, field.name, related[pk])
+                else:
+                    errors.setdefault(index, ValidationError({
+                        field.name: _(f'Object with id={pk} does not exist')
+                    }))
+
+        if self.generic_foreign_key is not None:
+            self.resolve_generic(instances, errors)
+
+        return errors
+
+    def resolve_generic(self, instances: List[models.Model], errors: Dict[int, ValidationError]) -> None:
+        """
+        Loads the generic related objects of the instances with one
+        query per content type. The many-to-many values are prefetched
+        as well, as they are part of the values stored in resources.
+
+        :param instances:
+        :param errors:
+        :return:
+        """
+        field = self.generic_foreign_key
+        pks = {}
+        for index, instance in enumerate(instances):
+            if index not in errors:
+                content_type_id = getattr(instance, f'{field.ct_field}_id')
+                pks.setdefault(content_type_id, set()).add(getattr(instance, field.fk_field))
+
+        objects = {}
+        for content_type_id, object_pks in pks.items():
+            model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+            values = []
+            for pk in object_pks:
+                try:
+                    values.append(model_class._meta.pk.to_python(pk))
+                except ValidationError:
+                    pass
+            queryset = model_class._default_manager.prefetch_related(
+                *[f.name for f in model_class._meta.many_to_many]
+            )
+            for pk, obj in queryset.in_bulk(values).items():
+                objects[(content_type_id, str(pk))] = obj
+
+        for index, instance in enumerate(instances):
+            if index not in errors:
+                key = (getattr(instance, f'{field.ct_field}_id'), str(getattr(instance, field.fk_field)))
+                field.set_cached_value(instance, objects.get(key))
+
+    def line_intervals(self, line):
+        from .intervals import LineIntervals
+
+        if line.pk not in self._intervals:
+            self._intervals[line.pk] = LineIntervals(line, self.model_class)
+        return self._intervals[line.pk]
+
+    def discard(self, instance: models.Model) -> None:
+        """
+        Removes a rejected event from the index of its line, so the
+        rows that follow are not checked against it.
+
+        :param instance:
+        :return:
+        """
+        intervals = self._intervals.get(getattr(instance, 'subscription_line_id', None))
+        if intervals is not None:
+            intervals.discard(instance)
+
+    def validate(self, instance: models.Model) -> None:
+        """
+        Runs the field and model validation of an instance whose
+        related objects have been resolved.
+
+        :param instance:
+        :return:
+        """
+        from .models import SubscriptionEvent
+
+        instance.clean_fields(exclude=[field.name for field in self.foreign_keys])
+        instance.clean()
+        if isinstance(instance, SubscriptionEvent) and \
+                getattr(settings, 'SUBSCRIPTION_PREVENT_OVERLAP', False):
+            instance.validate_no_overlap(self.line_intervals(instance.subscription_line))
+
+    def write(self, chunk: List[Tuple[int, models.Model]], result: ImportResult) -> None:
+        """
+        Writes the valid instances of a chunk in a single transaction.
+        If the database rejects the chunk, each instance is written in
+        its own savepoint to find the rejected rows.
+
+        :param chunk:
+        :param result:
+        :return:
+        """
+        manager = self.model_class._default_manager
+        try:
+            with transaction.atomic():
+                manager.bulk_create([instance for _, instance in chunk])
+            created = [instance for _, instance in chunk]
+        except IntegrityError:
+            created = []
+            for number, instance in chunk:
+                try:
+                    with transaction.atomic():
+                        manager.bulk_create([instance])
+                except IntegrityError as e:
+                    self.discard(instance)
+                    result.errors.append(RowError(number, {NON_FIELD_ERRORS: [str(e)]}))
+                else:
+                    created.append(instance)
+
+        result.created += len(created)
+        bulk_saved(self.model_class, created, created=True)
+
+    def process(self, chunk: List[Tuple[int, object]], result: ImportResult) -> None:
+        instances, numbers = [], []
+        for number, row in chunk:
+            try:
+                if isinstance(row, ValidationError):
+                    raise row
+                instances.append(self.build(row))
+                numbers.append(number)
+            except ValidationError as e:
+                result.errors.append(RowError(number, error_dict(e)))
+
+        errors = self.resolve(instances)
+        valid = []
+        for index, (number, instance) in enumerate(zip(numbers, instances)):
+            try:
+                if index in errors:
+                    raise errors[index]
+                self.validate(instance)
+                prepare([instance])
+            except ValidationError as e:
+                result.errors.append(RowError(number, error_dict(e)))
+            else:
+                valid.append((number, instance))
+
+        if valid:
+            self.write(valid, result)
+
+    def run(self, stream: Iterable[str], format: str = NDJSON) -> ImportResult:
+        """
+        Imports the rows of stream, reading batch_size rows at a time,
+        and returns the summary of the import.
+
+        :param stream:
+        :param format:
+        :return:
+        """
+        result = ImportResult()
+        started = time.perf_counter()
+        chunk = []
+        for row in self.rows(stream, format):
+            chunk.append(row)
+            if len(chunk) >= self.batch_size:
+                self.process(chunk, result)
+                chunk = []
+                logger.info(
+                    f'{self.model_class.__name__}: {result.created} created, '
+                    f'{result.failed} failed in {time.perf_counter() - started:.1f}s'
+                )
+        if chunk:
+            self.process(chunk, result)
+
+        result.errors.sort(key=lambda error: error.line)
+        result.duration = time.perf_counter() - started
+        logger.info(
+            f'{self.model_class.__name__}: imported {result.created} rows, '
+            f'{result.failed} failed, {result.rate:.1f} rows/s'
+        )
+        return result
@@ -0,0 +1,248 @@
+from bisect import bisect_left, insort
+from typing import Hashable, Iterable, List, NamedTuple, Optional, Type
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+DEFAULT_HORIZON = timezone.timedelta(days=365)
+
+
+class Interval(NamedTuple):
+    start: timezone.datetime
+    end: Optional[timezone.datetime]
+    key: Hashable
+
+
+class IntervalIndex:
+    """
+    Sorted index of half-open intervals, where a null end is unbounded.
+    Bounded intervals are kept sorted by start along with the longest
+    duration, so a query only scans the intervals that start between
+    its start minus that duration and its end; unbounded ones are kept
+    apart, sorted by start as well. Queries take O(log n + k) as long as
+    the durations are of the same order, as the occurrences of the
+    events of a line are.
+    """
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self._lock = threading.Lock()
+        self._bounded: List[Interval] = []
+        self._unbounded: List[Interval] = []
+        self.duration = timezone.timedelta(0)
+        for interval in intervals:
+            self.add(*interval)
+
+    def __len__(self) -> int:
+        return len(self._bounded) + len(self._unbounded)
+
+    def add(
+            self,
+            start: timezone.datetime,
+            end: Optional[timezone.datetime],
+            key: Hashable = None
+    ) -> None:
+        """
+        Adds the interval between start and end.
+
+        :param start:
+        :param end:
+        :param key:
+        :return:
+        """
+        interval = Interval(start, end, key)
+        with self._lock:
+            if end is None:
+                insort(self._unbounded, interval, key=lambda item: item.start)
+            else:
+                insort(self._bounded, interval, key=lambda item: item.start)
+                self.duration = max(self.duration, end - start)
+
+    def remove(
+            self,
+            start: timezone.datetime,
+            end: Optional[timezone.datetime],
+            key: Hashable = None
+    ) -> bool:
+        """
+        Removes one interval between start and end with the given key,
+        if any. The longest duration is kept, which only widens the
+        scans of later queries. Returns whether an interval was removed.
+
+        :param start:
+        :param end:
+        :param key:
+        :return:
+        """
+        interval = Interval(start, end, key)
+        with self._lock:
+            intervals = self._unbounded if end is None else self._bounded
+            index = bisect_left(intervals, start, key=lambda item: item.start)
+            while index < len(intervals) and intervals[index].start == start:
+                if intervals[index] == interval:
+                    del intervals[index]
+                    return True
+                index += 1
+
+        return False
+
+    def overlapping(
+            self,
+            start: timezone.datetime,
+            end: Optional[timezone.datetime] = None
+    ) -> List[Interval]:
+        """
+        Returns the intervals that overlap the one between start and
+        end, sorted by start.
+
+        :param start:
+        :param end:
+        :return:
+        """
+        def stop(intervals: List[Interval]) -> int:
+            if end is None:
+                return len(intervals)
+            return bisect_left(intervals, end, key=lambda item: item.start)
+
+        with self._lock:
+            bounded, unbounded = self._bounded, self._unbounded
+            low = bisect_left(bounded, start - self.duration, key=lambda item: item.start)
+            intervals = [
+                interval
+                for interval in bounded[low:stop(bounded)]
+                if interval.end > start
+            ]
+            intervals.extend(unbounded[:stop(unbounded)])
+
+        return sorted(intervals, key=lambda item: item.start)
+
+    def validate_no_overlap(
+            self,
+            start: timezone.datetime,
+            end: Optional[timezone.datetime] = None
+    ) -> None:
+        """
+        Raises a ValidationError if the interval between start and end
+        overlaps any interval of the index.
+
+        :param start:
+        :param end:
+        :return:
+        """
+        intervals = self.overlapping(start, end)
+        if intervals:
+            raise ValidationError(
+                _('The interval [%(start)s - %(end)s] overlaps [%(other_start)s - %(other_end)s]'),
+                code='overlap',
+                params={
+                    'start': start,
+                    'end': end,
+                    'other_start': intervals[0].start,
+                    'other_end': intervals[0].end,
+                }
+            )
+
+
+class LineIntervals:
+    """
+    Index of the occurrences of the events of a subscription line,
+    read with a single query. The occurrences are indexed from the
+    start of the line to its end or, for open lines, up to the horizon
+    given by the SUBSCRIPTION_OVERLAP_HORIZON setting (one year by
+    default). Events checked with validate_no_overlap can be added to
+    the index, so a batch of events is checked against the line and
+    against each other without querying again.
+    """
+    def __init__(
+            self,
+            line,
+            model_class: Optional[Type[models.Model]] = None,
+            exclude: Iterable = ()
+    ):
+        if model_class is None:
+            from .models import SubscriptionEvent
+            model_class = SubscriptionEvent
+
+        self.line = line
+        self.model_class = model_class
+        self.start = line.start
+        self.end = line.end or timezone.now() + getattr(
+            settings, 'SUBSCRIPTION_OVERLAP_HORIZON', DEFAULT_HORIZON
+        )
+        occurrences = model_class.objects.filter(
+            subscription_line_id=line.pk
+        ).exclude(pk__in=list(exclude)).occurrences(self.start, self.end)
+        self.index = IntervalIndex(
+            Interval(start, end, pk) for pk, start, end in occurrences.rows()
+        )
+
+    def occurrences(self, event) -> List[Interval]:
+        """
+        Returns the occurrences of an event, which may not be saved,
+        that start within the indexed period.
+
+        :param event:
+        :return:
+        """
+        from .managers import SubscriptionEventQuerySet
+
+        line_end = self.line.end
+        return [
+            Interval(
+                start,
+                line_end if line_end and (end is None or end > line_end) else end,
+                event.pk
+            )
+            for start, end in SubscriptionEventQuerySet.calendar_bounds(
+                event, self.start, self.end
+            )
+        ]
+
+    def overlapping(
+            self,
+            start: timezone.datetime,
+            end: Optional[timezone.datetime] = None
+    ) -> List[Interval]:
+        return self.index.overlapping(start, end)
+
+    def validate_no_overlap(self, event, add: bool = False) -> None:
+        """
+        Raises a ValidationError if an occurrence of the event overlaps
+        an occurrence of another event of the line. If add is True, the
+        occurrences of a valid event are added to the index.
+
+        :param event:
+        :param add:
+        :return:
+        """
+        occurrences = self.occurrences(event)
+        for occurrence in occurrences:
+            intervals = self.index.overlapping(occurrence.start, occurrence.end)
+            if intervals:
+                raise ValidationError(
+                    _('The occurrence [%(start)s - %(end)s] overlaps an occurrence of '
+                      'the event %(event)s of the same subscription line'),
+                    code='overlap',
+                    params={
+                        'start': occurrence.start,
+                        'end': occurrence.end,
+                        'event': intervals[0].key,
+                    }
+                )
+
+        if add:
+            for occurrence in occurrences:
+                self.index.add(*occurrence)
+
+    def discard(self, event) -> None:
+        """
+        Removes the occurrences of an event added by validate_no_overlap,
+        as when the event is not saved after all.
+
+        :param event:
+        :return:
+        """
+        for occurrence in self.occurrences(event):
+            self.index.remove(*occurrence)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from subscription.models import SubscriptionEvent
+
+
+class Command(BaseCommand):
+    help = 'Moves the next occurrence of the stale subscription events forward.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of events updated per query.'
+        )
+
+    def handle(self, *args, **options):
+        count = SubscriptionEvent.objects.all().advance(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(f'Advanced events: {count}')
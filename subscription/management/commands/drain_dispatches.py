@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from subscription.outbox import drain
+
+
+class Command(BaseCommand):
+    help = 'Delivers the available resource outbox entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of entries locked and delivered per transaction.'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Maximum number of batches, all available entries by default.'
+        )
+
+    def handle(self, *args, **options):
+        count = drain(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches']
+        )
+        self.stdout.write(f'Delivered dispatches: {count}')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from subscription.models import SubscriptionEvent
+from subscription.scheduler import fire_due
+
+
+class Command(BaseCommand):
+    help = 'Fires the resources of the subscription event occurrences that have started.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of events locked and fired per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        SubscriptionEvent.objects.all().advance()
+        count = fire_due(batch_size=options['batch_size'])
+        self.stdout.write(f'Fired events: {count}')
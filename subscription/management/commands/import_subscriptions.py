@@ -0,0 +1,56 @@
+import sys
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from subscription.importers import (
+    BulkImporter, CSV, DEFAULT_BATCH_SIZE, FORMATS, IMPORTABLE_MODELS, NDJSON
+)
+
+
+class Command(BaseCommand):
+    help = 'Imports subscriptions, lines, events or resources from a NDJSON or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model',
+            choices=sorted(IMPORTABLE_MODELS),
+            help='Model of the imported rows.'
+        )
+        parser.add_argument(
+            'path',
+            help='File to import, or - to read the standard input.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            default=None,
+            help='Format of the rows, given by the file extension by default.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Number of rows validated and written per transaction.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or (CSV if path.endswith('.csv') else NDJSON)
+        importer = BulkImporter(
+            apps.get_model('subscription', IMPORTABLE_MODELS[options['model']]),
+            batch_size=options['batch_size']
+        )
+
+        if path == '-':
+            result = importer.run(sys.stdin, format)
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                result = importer.run(stream, format)
+
+        for error in result.errors:
+            self.stderr.write(f'Line {error.line}: {error.errors}')
+        self.stdout.write(
+            f'Created: {result.created}, failed: {result.failed} '
+            f'({result.rate:.1f} rows/s)'
+        )
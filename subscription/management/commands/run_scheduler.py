@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from subscription.scheduler import OccurrenceScheduler
+
+
+class Command(BaseCommand):
+    help = 'Fires the resources of the subscription event occurrences as they start.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon',
+            type=int,
+            default=10,
+            help='Minutes of occurrences loaded ahead.'
+        )
+        parser.add_argument(
+            '--refill-interval',
+            type=int,
+            default=60,
+            help='Seconds between two reads of the events.'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = OccurrenceScheduler(
+            horizon=timezone.timedelta(minutes=options['horizon']),
+            refill_interval=timezone.timedelta(seconds=options['refill_interval'])
+        )
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
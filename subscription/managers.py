@@ -1,14 +1,17 @@
-from typing import List, Callable, Dict, Type, Optional
+from typing import List, Callable, Dict, Iterable, Iterator, NamedTuple, Tuple, Type, Optional
 import logging
 
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldDoesNotExist
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Mod
 from django.db.models.signals import ModelSignal
 from django.utils import timezone
 from django.utils.module_loading import import_string
 
-from .signals import default_receiver
+from .expressions import Microseconds, elapsed
+from .signals import default_receiver, notify_objects
+from .wiring import signal_wiring
 
 SUBSCRIPTION_LINE_STRING = "subscription.models.subscription.SubscriptionLine"
 SUBSCRIPTION_EVENT_STRING = "subscription.models.subscription.SubscriptionEvent"
@@ -83,16 +86,259 @@ class SubscriptionLineManager(models.Manager):
         )
 
 
+class Occurrences(NamedTuple):
+    """
+    Occurrences of subscription events stored by columns: the i-th
+    item of each column belongs to the i-th occurrence.
+    """
+    event: Tuple[int, ...]
+    start: Tuple[timezone.datetime, ...]
+    end: Tuple[Optional[timezone.datetime], ...]
+
+    def rows(self) -> Iterator[Tuple[int, timezone.datetime, Optional[timezone.datetime]]]:
+        return zip(self.event, self.start, self.end)
+
+
 class SubscriptionEventQuerySet(models.QuerySet):
+    def has_fixed_recurrence(self) -> bool:
+        """
+        Checks if the occurrences of the model are shifted by the value
+        of the recurrence field, as opposed to calendar based proxies.
+
+        :return:
+        """
+        from .models.abstract import AbstractPeriodicEvent
+
+        return \
+            self.model.occurrence_index is AbstractPeriodicEvent.occurrence_index and \
+            self.model.occurrence_bounds is AbstractPeriodicEvent.occurrence_bounds
+
+    def occurring(self, date: Optional[timezone.datetime] = None) -> models.QuerySet:
+        """
+        Returns the events with an occurrence that contains date (the
+        current date by default). The occurrence of a recurring event is
+        found with modular arithmetic on the time elapsed since its
+        start, so it is resolved by the database. Models with calendar
+        based occurrences are filtered in Python after narrowing the
+        candidates in the database.
+
+        :param date:
+        :return:
+        """
+        date = date or timezone.now()
+        queryset = self.filter(
+            models.Q(subscription_line__end__isnull=True) |
+            models.Q(subscription_line__end__gt=date),
+            start__lte=date,
+        )
+
+        if not self.has_fixed_recurrence():
+            return self.filter(pk__in=[
+                event.pk
+                for event in queryset.select_related('subscription_line')
+                if event.occurrence_at(date) is not None
+            ])
+
+        zero = timezone.timedelta(0)
+        return queryset.alias(
+            offset=Mod(
+                elapsed(date),
+                Microseconds(models.F('recurrence'))
+            ),
+            duration=Microseconds(models.F('end') - models.F('start')),
+        ).filter(
+            models.Q(end__isnull=True) |
+            models.Q(recurrence__isnull=True, end__gt=date) |
+            models.Q(recurrence=zero, end__gt=date) |
+            models.Q(recurrence__gt=zero, offset__lt=models.F('duration'))
+        )
+
+    def occurrences(
+            self,
+            start: timezone.datetime,
+            end: timezone.datetime
+    ) -> Occurrences:
+        """
+        Returns the occurrences that overlap the period between start and
+        end, truncated to the end of their subscription line, ordered by
+        event and start date. Only the dates of the events are read, and
+        the occurrences of recurring events are computed with timedelta
+        arithmetic from the first one that has not ended at start, so no
+        model instance is built per occurrence. Models with calendar
+        based occurrences build one instance per event.
+
+        :param start:
+        :param end:
+        :return:
+        """
+        fixed = self.has_fixed_recurrence()
+        queryset = self.filter(
+            models.Q(subscription_line__end__isnull=True) |
+            models.Q(subscription_line__end__gt=start),
+            start__lt=end,
+        )
+        if fixed:
+            queryset = queryset.filter(
+                models.Q(end__isnull=True) |
+                models.Q(end__gt=start) |
+                models.Q(recurrence__gt=timezone.timedelta(0))
+            )
+
+        events, starts, ends = [], [], []
+        for pk, event_start, event_end, recurrence, line_end in queryset.order_by('pk').values_list(
+                'pk', 'start', 'end', 'recurrence', 'subscription_line__end'
+        ):
+            limit = min(end, line_end) if line_end else end
+            if not fixed:
+                bounds = self.calendar_bounds(
+                    self.model(start=event_start, end=event_end, recurrence=recurrence),
+                    start,
+                    limit
+                )
+            elif event_end and recurrence:
+                first = 0 if start < event_end else (start - event_end) // recurrence + 1
+                last = -((event_start - limit) // recurrence)
+                bounds = (
+                    (event_start + recurrence * index, event_end + recurrence * index)
+                    for index in range(first, last)
+                )
+            else:
+                bounds = [(event_start, event_end)] if event_start < limit else []
+
+            for occurrence_start, occurrence_end in bounds:
+                if line_end and (occurrence_end is None or occurrence_end > line_end):
+                    occurrence_end = line_end
+                if occurrence_end is not None and occurrence_end <= start:
+                    continue
+                events.append(pk)
+                starts.append(occurrence_start)
+                ends.append(occurrence_end)
+
+        return Occurrences(tuple(events), tuple(starts), tuple(ends))
+
+    @staticmethod
+    def calendar_bounds(
+            event,
+            start: timezone.datetime,
+            end: timezone.datetime
+    ) -> Iterator[Tuple[timezone.datetime, Optional[timezone.datetime]]]:
+        """
+        Generates the bounds of the occurrences of a calendar based event
+        that start before end, from the first one that has not ended at
+        start.
+
+        :param event:
+        :param start:
+        :param end:
+        :return:
+        """
+        index = event.occurrence_index(start)
+        while True:
+            bounds = event.occurrence_bounds(index)
+            if bounds[0] >= end:
+                break
+            yield bounds
+            if not (event.end and event._recurrence):
+                break
+            index += 1
+
     def current(self, line_id):
-        model_class = import_string(SUBSCRIPTION_EVENT_STRING)
-        now = model_class.now()
-        return self.filter(
-            start__date__lte=now,
-            end__date__gt=now,
+        return self.occurring().filter(
             subscription_line_id=line_id
         )
 
+    def stale(self, date: Optional[timezone.datetime] = None) -> models.QuerySet:
+        """
+        Returns the events whose materialized next occurrence has ended
+        at date (the current date by default), or has not been computed
+        yet for an event that can still occur. Events found to have no
+        occurrences left are exhausted and not selected again, so
+        advance() converges.
+
+        :param date:
+        :return:
+        """
+        date = date or timezone.now()
+        return self.filter(
+            models.Q(next_end__lte=date) |
+            models.Q(
+                models.Q(subscription_line__end__isnull=True) |
+                models.Q(subscription_line__end__gt=date),
+                models.Q(end__isnull=True) |
+                models.Q(end__gt=date) |
+                models.Q(recurrence__gt=timezone.timedelta(0)),
+                next_start__isnull=True,
+                exhausted=False,
+            )
+        )
+
+    def due(self, date: Optional[timezone.datetime] = None) -> models.QuerySet:
+        """
+        Returns the events whose materialized next occurrence has started
+        and has not ended at date (the current date by default), and
+        has not been fired yet.
+
+        :param date:
+        :return:
+        """
+        date = date or timezone.now()
+        return self.filter(
+            models.Q(next_end__isnull=True) | models.Q(next_end__gt=date),
+            models.Q(fired_start__isnull=True) | models.Q(fired_start__lt=models.F('next_start')),
+            next_start__lte=date,
+        )
+
+    def advance(
+            self,
+            date: Optional[timezone.datetime] = None,
+            batch_size: int = 1000
+    ) -> int:
+        """
+        Moves next_start and next_end of the stale events forward to
+        their first occurrence that has not ended, in chunks of
+        batch_size events. Returns the number of updated events.
+
+        :param date:
+        :param batch_size:
+        :return:
+        """
+        date = date or timezone.now()
+        return self.stale(date).recompute(date, batch_size)
+
+    def recompute(
+            self,
+            date: Optional[timezone.datetime] = None,
+            batch_size: int = 1000
+    ) -> int:
+        """
+        Sets next_start, next_end and exhausted of the events from their
+        first occurrence that has not ended at date (the current date by
+        default), in chunks of batch_size events. Returns the number of
+        updated events.
+
+        :param date:
+        :param batch_size:
+        :return:
+        """
+        date = date or timezone.now()
+        queryset = self.select_related('subscription_line').order_by('pk')
+
+        count, last = 0, None
+        while True:
+            chunk = queryset if last is None else queryset.filter(pk__gt=last)
+            events = list(chunk[:batch_size])
+            if not events:
+                break
+
+            for event in events:
+                event.update_next_occurrence(date)
+            self.bulk_update(events, ['next_start', 'next_end', 'exhausted'])
+
+            count += len(events)
+            last = events[-1].pk
+
+        return count
+
 
 class SubscriptionEventManager(models.Manager):
     def get_queryset(self) -> SubscriptionEventQuerySet:
@@ -101,6 +347,13 @@ class SubscriptionEventManager(models.Manager):
             using=self._db
         )
 
+    def occurrences(
+            self,
+            start: timezone.datetime,
+            end: timezone.datetime
+    ) -> Occurrences:
+        return self.get_queryset().occurrences(start, end)
+
 
 class ResourceQuerySet(models.QuerySet):
     def active(self) -> models.QuerySet:
@@ -116,6 +369,20 @@ class ResourceQuerySet(models.QuerySet):
             'subscription_event__subscription_line__subscription'
         )
 
+    def ready(self) -> models.QuerySet:
+        """
+        Returns the resources that meet the conditions to execute the
+        callback. The current occurrence of each subscription event is
+        resolved by the database, so the whole queryset is evaluated
+        with a single query.
+
+        :return:
+        """
+        model_class = import_string(SUBSCRIPTION_EVENT_STRING)
+        return self.active().filter(
+            subscription_event__in=model_class.objects.all().occurring()
+        )
+
     def related_objects(self, instance: models.Model) -> models.QuerySet:
         """
         Returns all related resource objects with the instance.
@@ -126,7 +393,22 @@ class ResourceQuerySet(models.QuerySet):
         ct = ContentType.objects.get_for_model(instance)
         return self.filter(
             content_type=ct,
-            object_pk=str(instance.id)
+            object_pk=str(instance.pk)
+        )
+
+    def related_to(self, model_class: Type[models.Model], pks: Iterable) -> models.QuerySet:
+        """
+        Returns all related resource objects with any of the instances
+        of model_class whose primary key is in pks.
+
+        :param model_class:
+        :param pks:
+        :return:
+        """
+        ct = ContentType.objects.get_for_model(model_class)
+        return self.filter(
+            content_type=ct,
+            object_pk__in=[str(pk) for pk in pks]
         )
 
 
@@ -159,13 +441,17 @@ class ResourceManager(models.Manager):
     ) -> None:
         """
         Connects signal with all related models to any existing active
-        resource.
+        resource. The default signal and receiver are dispatched by the
+        signal wiring, which only has to watch the models.
         """
         model_classes = [model_class] if model_class else self.related_models()
         for model_class in model_classes:
-            signal.connect(receiver, sender=model_class)
+            if signal_wiring.handles(signal, receiver):
+                signal_wiring.connect(model_class)
+            else:
+                signal.connect(receiver, sender=model_class)
             logger.info(
-                f'Signal {signal}: {model_class} -> {default_receiver}'
+                f'Signal {signal}: {model_class} -> {receiver}'
             )
 
     def disconnect(
@@ -179,11 +465,34 @@ class ResourceManager(models.Manager):
         resource.
         """
         model_classes = [model_class] if model_class else self.related_models()
+        if signal_wiring.handles(signal, receiver):
+            return {
+                model_class: signal_wiring.disconnect(model_class)
+                for model_class in model_classes
+            }
         return {
             model_class: signal.disconnect(receiver, sender=model_class)
             for model_class in model_classes
         }
 
+    def notify_changed(
+            self,
+            model_class: Type[models.Model],
+            pks: Iterable,
+            created: bool = False
+    ) -> int:
+        """
+        Dispatches the resources related to the instances of model_class
+        changed without sending signals, such as by QuerySet.update or
+        bulk_create. Returns the number of dispatched objects.
+
+        :param model_class:
+        :param pks:
+        :param created:
+        :return:
+        """
+        return notify_objects(model_class, pks, created=created, using=self.db)
+
     def exists_resources(self, content_type: ContentType) -> bool:
         """
         Checks if exists active resources for content_type.
@@ -192,3 +501,71 @@ class ResourceManager(models.Manager):
         """
         qs = self.filter(content_type=content_type)
         return qs.active().exists()
+
+
+class ResourceDispatchQuerySet(models.QuerySet):
+    def available(self, date: Optional[timezone.datetime] = None) -> models.QuerySet:
+        """
+        Returns the entries that can be delivered at date (the current
+        date by default), oldest first.
+
+        :param date:
+        :return:
+        """
+        return self.filter(
+            available_at__lte=date or timezone.now()
+        ).order_by('available_at', 'pk')
+
+
+class ResourceDispatchManager(models.Manager):
+    def get_queryset(self) -> ResourceDispatchQuerySet:
+        return ResourceDispatchQuerySet(
+            self.model,
+            using=self._db
+        )
+
+
+class NotifyChangesQuerySetMixin:
+    """
+    Queryset mixin for models watched by resources. The objects changed
+    by bulk_create, bulk_update and update are dispatched once per
+    operation, as post_save is not sent for them.
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if signal_wiring.watches(self.model):
+            notify_objects(
+                self.model,
+                [obj.pk for obj in objs if obj.pk is not None],
+                created=True,
+                using=self.db
+            )
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if signal_wiring.watches(self.model):
+            notify_objects(self.model, [obj.pk for obj in objs], using=self.db)
+        return rows
+
+    def update(self, **kwargs):
+        if not signal_wiring.watches(self.model):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            pks = list(self.values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            notify_objects(self.model, pks, using=self.db)
+        return rows
+
+
+class NotifyChangesQuerySet(NotifyChangesQuerySetMixin, models.QuerySet):
+    pass
+
+
+class NotifyChangesManager(models.Manager):
+    def get_queryset(self) -> NotifyChangesQuerySet:
+        return NotifyChangesQuerySet(
+            self.model,
+            using=self._db
+        )
@@ -1,23 +1,36 @@
-from django.apps import apps
-from subscription.models.decorators import DEFAULT_RECEIVER, DEFAULT_SIGNAL
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from subscription.wiring import signal_wiring
 
 
 class SubscriberMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         """
         Connect resources via post save signal to default
-        receiver.
+        receiver. The related models are loaded lazily, when the
+        first request is handled, so starting a worker does not query
+        the database. Outside of requests, they are loaded on the
+        first save of any model.
 
         :param get_response:
         """
         self.get_response = get_response
-        model_class = apps.get_model('subscription', 'Resource')
-
-        model_class.objects.connect(
-            DEFAULT_SIGNAL,
-            DEFAULT_RECEIVER
-        )
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        signal_wiring.setup()
         response = self.get_response(request)
         return response
+
+    async def __acall__(self, request):
+        if not signal_wiring.loaded:
+            await sync_to_async(signal_wiring.setup)()
+        response = await self.get_response(request)
+        return response
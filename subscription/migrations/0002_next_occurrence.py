@@ -0,0 +1,50 @@
+# Generated by Django 5.0.10 on 2026-10-17 12:33
+
+import subscription.models.mixins
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySubscriptionEvent',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=(subscription.models.mixins.DailyEventMixin, 'subscription.subscriptionevent'),
+        ),
+        migrations.CreateModel(
+            name='MonthlySubscriptionEvent',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=(subscription.models.mixins.MonthlyEventMixin, 'subscription.subscriptionevent'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionevent',
+            name='next_end',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Next end date'),
+        ),
+        migrations.AddField(
+            model_name='subscriptionevent',
+            name='next_start',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Next start date'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptionevent',
+            index=models.Index(fields=['next_start', 'next_end'], name='subscriptio_next_st_68ef7b_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+import ast
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def convert(apps, schema_editor, parse, dump):
+    """
+    Rewrites content_object_fields of every resource in batches of
+    BATCH_SIZE rows, walking the table by primary key. It runs while
+    the column is still a text column, in both directions.
+    """
+    Resource = apps.get_model('subscription', 'Resource')
+    queryset = Resource.objects.using(schema_editor.connection.alias).only(
+        'pk', 'content_object_fields'
+    ).order_by('pk')
+
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(batch[:BATCH_SIZE])
+        if not batch:
+            break
+
+        for resource in batch:
+            value = resource.content_object_fields
+            resource.content_object_fields = dump(parse(value) if value else {})
+        Resource.objects.using(schema_editor.connection.alias).bulk_update(
+            batch, ['content_object_fields']
+        )
+        last_pk = batch[-1].pk
+
+
+def repr_to_json(apps, schema_editor):
+    convert(
+        apps,
+        schema_editor,
+        ast.literal_eval,
+        lambda value: json.dumps(value, cls=DjangoJSONEncoder)
+    )
+
+
+def json_to_repr(apps, schema_editor):
+    convert(apps, schema_editor, json.loads, lambda value: repr(value) if value else '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0002_next_occurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(repr_to_json, json_to_repr),
+        migrations.AlterField(
+            model_name='resource',
+            name='content_object_fields',
+            field=models.JSONField(blank=True, default=dict, encoder=DjangoJSONEncoder, help_text='key-value pair with the values of the current instance of the related model'),
+        ),
+    ]
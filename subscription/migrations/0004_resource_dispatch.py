@@ -0,0 +1,31 @@
+# Generated by Django 5.0.10 on 2026-10-17 12:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0003_content_object_fields_json'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceDispatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_created', models.BooleanField(default=False, help_text='Whether the related object was created by the change')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('available_at', models.DateTimeField(blank=True, default=django.utils.timezone.now, help_text='Date from which the entry can be delivered, empty once given up', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dispatches', to='subscription.resource')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['available_at', 'id'], name='subscriptio_availab_ea5657_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-17 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0004_resource_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionevent',
+            name='fired_start',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Start date of the last occurrence whose resources have been fired', null=True, verbose_name='Last fired start date'),
+        ),
+    ]
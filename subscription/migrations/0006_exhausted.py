@@ -0,0 +1,18 @@
+# Generated by Django 5.0.10 on 2026-10-17 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0005_fired_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subscriptionevent',
+            name='exhausted',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether the event had no occurrences left when its next occurrence was last computed', verbose_name='Exhausted'),
+        ),
+    ]
@@ -2,9 +2,10 @@ from .subscription import (
     Subscription, SubscriptionLine, SubscriptionEvent, MonthlySubscriptionEvent, DailySubscriptionEvent
 )
 from .resource import Resource
+from .dispatch import ResourceDispatch
 
 
 __all__ = [
     'Subscription', 'SubscriptionLine', 'SubscriptionEvent', 'Resource', 'MonthlySubscriptionEvent',
-    'DailySubscriptionEvent'
+    'DailySubscriptionEvent', 'ResourceDispatch'
 ]
@@ -1,4 +1,4 @@
-from typing import Generator
+from typing import Generator, Optional, Tuple
 
 from django.db import models
 from django.core.exceptions import ValidationError
@@ -131,6 +131,93 @@ class AbstractPeriodicEvent(AbstractInterval):
         """
         return self.recurrence
 
+    def occurrence_bounds(
+            self,
+            index: int
+    ) -> Tuple[timezone.datetime, Optional[timezone.datetime]]:
+        """
+        Returns the start and end date of the occurrence at position
+        index, the first occurrence being the event itself. The dates
+        are not truncated to the end of the subscription line.
+
+        :param index:
+        :return:
+        """
+        if not index:
+            return self.start, self.end
+
+        duration = self._recurrence * index
+        return self.start + duration, self.end + duration
+
+    def occurrence_index(self, date: timezone.datetime) -> int:
+        """
+        Returns the position of the first occurrence that has not ended
+        at the given date, without walking the previous ones.
+
+        :param date:
+        :return:
+        """
+        if not (self.end and self._recurrence) or date < self.end:
+            return 0
+        return (date - self.end) // self._recurrence + 1
+
+    def occurrence(self, index: int) -> 'AbstractPeriodicEvent':
+        """
+        Returns a new event with the dates of the occurrence at position
+        index, truncated to the end of the subscription line.
+
+        :param index:
+        :return:
+        """
+        start, end = self.occurrence_bounds(index)
+        line = self.subscription_line
+
+        return type(self)(**{
+            'start': start,
+            'subscription_line': line,
+            'end': end if not line.end or (end and end < line.end) else line.end
+        })
+
+    def next_occurrence(
+            self,
+            date: timezone.datetime
+    ) -> Optional['AbstractPeriodicEvent']:
+        """
+        Returns the first occurrence that has not ended at the given
+        date, if any. Only that occurrence is built, regardless of the
+        age of the event.
+
+        :param date:
+        :return:
+        """
+        index = self.occurrence_index(date)
+        end = self.occurrence_bounds(index)[1]
+        if end and date >= end:
+            return None
+
+        event = self.occurrence(index)
+        try:
+            event.clean()
+        except ValidationError:
+            return None
+
+        if not event.end or date < event.end:
+            return event
+
+    def occurrence_at(
+            self,
+            date: timezone.datetime
+    ) -> Optional['AbstractPeriodicEvent']:
+        """
+        Returns the occurrence that contains the given date, if any.
+
+        :param date:
+        :return:
+        """
+        event = self.next_occurrence(date)
+        if event is not None and date in event:
+            return event
+
     @property
     def events(self) -> Generator['AbstractPeriodicEvent', None, None]:
         """
@@ -142,16 +229,20 @@ class AbstractPeriodicEvent(AbstractInterval):
         If it has an end date but does not have a recurrence
         value, it will also be considered a one-time event.
 
+        Occurrences that have already ended are skipped arithmetically,
+        so the cost does not depend on the age of the event.
+
         :return:
         """
-        while not self.end or self.now() < self.end:
-            line = self.subscription_line
+        now = self.now()
+        index = self.occurrence_index(now)
+
+        while True:
+            end = self.occurrence_bounds(index)[1]
+            if end and now >= end:
+                break
 
-            event = type(self)(**{
-                'start': self.start,
-                'subscription_line': line,
-                'end': self.end if self < line else line.end
-            })
+            event = self.occurrence(index)
             try:
                 event.clean()
             except ValidationError:
@@ -161,7 +252,7 @@ class AbstractPeriodicEvent(AbstractInterval):
                 if not (self.end and self._recurrence):
                     break
 
-            self.__iadd__(self._recurrence)
+            index += 1
 
     def __lt__(self, interval: AbstractInterval):
         return \
@@ -4,6 +4,7 @@ from typing import Callable
 from django.db.models.signals import post_save, ModelSignal
 
 from ..signals import default_receiver
+from ..wiring import signal_wiring
 
 DEFAULT_SIGNAL = post_save
 DEFAULT_RECEIVER = default_receiver
@@ -25,9 +26,11 @@ class ConnectSignalDecorator(object):
             model_class = args[0].content_type.model_class()
             state = getattr(args[0], '_state')
 
-            if state.adding:
+            if state.adding and signal_wiring.handles(self.signal, self.receiver):
+                signal_wiring.connect(model_class)
+            elif state.adding:
                 self.signal.connect(self.receiver, sender=model_class)
-            func(*args)
+            return func(*args, **kwargs)
 
         return wrapper
 
@@ -0,0 +1,47 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from django.conf import settings
+
+from .resource import Resource
+from ..managers import ResourceDispatchManager
+
+
+class ResourceDispatch(models.Model):
+    """
+    Outbox entry of a resource whose callback has to be run for a
+    change of its related object. Entries are written in the same
+    transaction as the change and deleted once delivered.
+    """
+    resource = models.ForeignKey(
+        Resource,
+        on_delete=models.CASCADE,
+        related_name='dispatches',
+    )
+    object_created = models.BooleanField(
+        default=False,
+        help_text=_('Whether the related object was created by the change'),
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        default=timezone.now,
+        help_text=_('Date from which the entry can be delivered, empty once given up'),
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects = ResourceDispatchManager()
+
+    def __str__(self):
+        return '%s (%s): %s' % (
+            self.__class__.__name__,
+            self.pk,
+            self.resource_id
+        )
+
+    class Meta:
+        abstract = 'subscription' not in settings.INSTALLED_APPS
+        indexes = [
+            models.Index(fields=['available_at', 'id']),
+        ]
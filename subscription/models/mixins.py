@@ -28,6 +28,44 @@ class MonthlyEventMixin:
 
         return self
 
+    def occurrence_bounds(self, index: int):
+        """
+        Returns the first and last day of the month that is index months
+        after the start date.
+
+        :param index:
+        :return:
+        """
+        if not index:
+            return self.start, self.end
+
+        year, month = divmod(self.start.year * 12 + self.start.month - 1 + index, 12)
+        start = self.start.replace(year=year, month=month + 1, day=1)
+        days = monthrange(start.year, start.month)[1]
+
+        return start, start.replace(day=days)
+
+    def occurrence_index(self, date: timezone.datetime) -> int:
+        """
+        Returns the number of months between the start date and the
+        given date, moved forward if that month has already ended.
+
+        :param date:
+        :return:
+        """
+        if not self.end or date < self.end:
+            return 0
+        if timezone.is_aware(date) and self.start.tzinfo:
+            date = date.astimezone(self.start.tzinfo)
+
+        index = max(
+            (date.year - self.start.year) * 12 + date.month - self.start.month, 1
+        )
+        if self.occurrence_bounds(index)[1] <= date:
+            index += 1
+
+        return index
+
 
 class DailyEventMixin:
     @property
@@ -49,3 +87,28 @@ class DailyEventMixin:
         self.end = self.start + duration
 
         return self
+
+    def occurrence_bounds(self, index: int):
+        """
+        Returns the day that is index days after the start date.
+
+        :param index:
+        :return:
+        """
+        if not index:
+            return self.start, self.end
+
+        start = self.start + self._recurrence * index
+        return start, start + self._recurrence
+
+    def occurrence_index(self, date: timezone.datetime) -> int:
+        """
+        Returns the number of whole days between the start date and the
+        given date.
+
+        :param date:
+        :return:
+        """
+        if not self.end or date < self.end:
+            return 0
+        return max((date - self.start) // self._recurrence, 1)
@@ -1,7 +1,6 @@
-from typing import ClassVar
-
-import ast
+from typing import ClassVar, List, Optional, Union
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models.signals import post_save, ModelSignal
 from django.core.exceptions import ValidationError
@@ -25,8 +24,10 @@ class Resource(AbstractGenericObjectResource):
         SubscriptionEvent,
         on_delete=models.CASCADE,
     )
-    content_object_fields = models.TextField(
+    content_object_fields = models.JSONField(
         blank=True,
+        default=dict,
+        encoder=DjangoJSONEncoder,
         help_text=_(
             'key-value pair with the values of the current instance of '
             'the related model'
@@ -42,6 +43,24 @@ class Resource(AbstractGenericObjectResource):
     active = models.BooleanField(default=True)
     objects = ResourceManager()
 
+    def get_snapshot_fields(self) -> Union[List[str], str]:
+        """
+        Returns the names of the fields stored from the related model:
+        the keys of the current values or all fields if there are none.
+
+        :return:
+        """
+        values = self.get_stored_values()
+        return [*values] if values else serializers.ALL_FIELDS
+
+    def get_stored_values(self) -> dict:
+        """
+        Returns the values of the related model stored in the resource.
+
+        :return:
+        """
+        return dict(self.content_object_fields or {})
+
     def get_values_from_related_object(self, model_class: models.Model) -> dict:
         """
         Returns a dict with the values of the fields of the related
@@ -52,12 +71,31 @@ class Resource(AbstractGenericObjectResource):
         """
         from subscription.serializers import GenericSerializer
 
-        return GenericSerializer.from_model(
+        return GenericSerializer.snapshot(
             model_class,
-            [*ast.literal_eval(self.content_object_fields)]
-            if self.content_object_fields else serializers.ALL_FIELDS,
+            self.get_snapshot_fields(),
             self.content_object
-        ).data
+        )
+
+    def refresh_snapshot(self, values: Optional[dict] = None) -> bool:
+        """
+        Stores the values of the related model, unless they are the
+        same as the stored ones. Only content_object_fields is written.
+        Returns True if the resource has been updated.
+
+        :param values: values of the related model, if already known.
+        :return:
+        """
+        if values is None:
+            values = self.get_values_from_related_object(
+                self.content_type.model_class()
+            )
+        if self.get_stored_values() == dict(values):
+            return False
+
+        self.content_object_fields = values
+        super().save(update_fields=['content_object_fields'])
+        return True
 
     @property
     def is_ready(self) -> bool:
@@ -68,9 +106,9 @@ class Resource(AbstractGenericObjectResource):
         :return:
         """
         return \
-            self.subscription_event.current is not None and \
+            self.active and \
             self.subscription_event.subscription_line.subscription.active and \
-            self.active
+            self.subscription_event.current is not None
 
     def clean(self):
         """
@@ -83,27 +121,24 @@ class Resource(AbstractGenericObjectResource):
                 _(f'Referenced object <{missing}> does not exist')
             )
 
-        if self.content_object_fields:
-            try:
-                fields = ast.literal_eval(self.content_object_fields)
-                if not isinstance(fields, dict):
-                    raise ValidationError(
-                        _(f'malformed node or string: "{self.content_object_fields}"')
-                    )
-                cls = self.content_type.model_class()
-                model_fields = [
-                    f.name
-                    for f in cls._meta.get_fields(
-                        include_hidden=self.INCLUDE_HIDDEN
-                    )
-                ]
-                unknown = set(fields.keys()) - set(model_fields)
-                if unknown:
-                    raise ValidationError(
-                        _(f'Unknown related fields: {unknown}')
-                    )
-            except ValueError as e:
-                raise ValidationError(e)
+        fields = self.content_object_fields
+        if fields:
+            if not isinstance(fields, dict):
+                raise ValidationError(
+                    _(f'Expected a mapping of field values: "{fields}"')
+                )
+            cls = self.content_type.model_class()
+            model_fields = [
+                f.name
+                for f in cls._meta.get_fields(
+                    include_hidden=self.INCLUDE_HIDDEN
+                )
+            ]
+            unknown = set(fields.keys()) - set(model_fields)
+            if unknown:
+                raise ValidationError(
+                    _(f'Unknown related fields: {unknown}')
+                )
 
     @connect_signal(signal=post_save, receiver=default_receiver)
     def save(self, *args, **kwargs):
@@ -1,14 +1,18 @@
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext as _
 from django.conf import settings
+from django.utils import timezone
 
 from .mixins import MonthlyEventMixin, DailyEventMixin
 from .abstract import AbstractInterval, AbstractPeriodicEvent, AbstractGenericObjectResource
 from ..managers import SubscriptionManager, SubscriptionLineManager, SubscriptionEventManager
 
+if TYPE_CHECKING:
+    from ..intervals import LineIntervals
+
 
 class Subscription(AbstractGenericObjectResource):
     name = models.CharField(
@@ -38,6 +42,25 @@ class SubscriptionLine(AbstractInterval):
     )
     objects = SubscriptionLineManager()
 
+    def save(self, *args, **kwargs):
+        """
+        Recomputes the next occurrence of the events of the line when its
+        dates may have changed, as its end bounds their occurrences: an
+        extended line can make an exhausted event occur again.
+
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        adding = self._state.adding
+        result = super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if not adding and (update_fields is None or {'start', 'end'} & set(update_fields)):
+            self.subscriptionevent_set.all().recompute()
+
+        return result
+
     def __str__(self):
         return '%s (%s): %s [%s - %s]' % (
             self.__class__.__name__,
@@ -56,6 +79,31 @@ class SubscriptionEvent(AbstractPeriodicEvent):
         SubscriptionLine,
         on_delete=models.CASCADE
     )
+    next_start = models.DateTimeField(
+        verbose_name=_('Next start date'),
+        null=True,
+        blank=True,
+        editable=False
+    )
+    next_end = models.DateTimeField(
+        verbose_name=_('Next end date'),
+        null=True,
+        blank=True,
+        editable=False
+    )
+    fired_start = models.DateTimeField(
+        verbose_name=_('Last fired start date'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Start date of the last occurrence whose resources have been fired'),
+    )
+    exhausted = models.BooleanField(
+        verbose_name=_('Exhausted'),
+        default=False,
+        editable=False,
+        help_text=_('Whether the event had no occurrences left when its next occurrence was last computed'),
+    )
     objects = SubscriptionEventManager()
 
     def clean(self):
@@ -84,15 +132,80 @@ class SubscriptionEvent(AbstractPeriodicEvent):
             )
         super().clean()
 
+    def validate_constraints(self, exclude=None):
+        """
+        If the SUBSCRIPTION_PREVENT_OVERLAP setting is enabled, checks as
+        well that the occurrences of the event do not overlap the ones of
+        the other events of the line. It runs from full_clean() only, so
+        the occurrences built by clean() callers are not checked.
+
+        :param exclude:
+        :return:
+        """
+        super().validate_constraints(exclude=exclude)
+        if getattr(settings, 'SUBSCRIPTION_PREVENT_OVERLAP', False):
+            self.validate_no_overlap()
+
+    def validate_no_overlap(self, intervals: Optional['LineIntervals'] = None) -> None:
+        """
+        Raises a ValidationError if an occurrence of the event overlaps
+        an occurrence of another event of the line, as indexed by
+        intervals if given, which then gets the occurrences of the event
+        added.
+
+        :param intervals:
+        :return:
+        """
+        if intervals is None:
+            from ..intervals import LineIntervals
+
+            LineIntervals(
+                self.subscription_line,
+                type(self),
+                exclude=[self.pk] if self.pk else []
+            ).validate_no_overlap(self)
+        else:
+            intervals.validate_no_overlap(self, add=True)
+
     @property
     def current(self) -> Optional['SubscriptionEvent']:
-        now = self.now()
+        """
+        Returns the occurrence that contains the current date, if any.
+
+        :return:
+        """
+        return self.occurrence_at(self.now())
+
+    def update_next_occurrence(self, date: Optional[timezone.datetime] = None) -> None:
+        """
+        Sets next_start and next_end with the dates of the first
+        occurrence that has not ended at the given date (the current date
+        by default), or null if there are no more occurrences, in which
+        case the event is marked as exhausted: later occurrences start
+        even later, so none of them can be valid either.
+
+        :param date:
+        :return:
+        """
+        event = self.next_occurrence(date or self.now())
+        self.next_start, self.next_end = \
+            (event.start, event.end) if event else (None, None)
+        self.exhausted = event is None
+
+    def save(self, *args, **kwargs):
+        """
+        Keeps the next occurrence in sync with the dates of the event.
+
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        self.update_next_occurrence()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'next_start', 'next_end', 'exhausted'}
 
-        for event in self.events:
-            if now in event:
-                return event
-            elif self.end and now > self.subscription_line.end:
-                break
+        return super().save(*args, **kwargs)
 
     def __str__(self):
         return '%s (%s): %s [%s - %s]' % (
@@ -107,6 +220,11 @@ class SubscriptionEvent(AbstractPeriodicEvent):
         abstract = 'subscription' not in settings.INSTALLED_APPS
         unique_together = ('start', 'end', 'subscription_line')
         get_latest_by = ('start',)
+        indexes = [
+            models.Index(
+                fields=['next_start', 'next_end']
+            ),
+        ]
 
 
 class MonthlySubscriptionEvent(MonthlyEventMixin, SubscriptionEvent):
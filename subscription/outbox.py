@@ -0,0 +1,154 @@
+from typing import Iterable, List, Optional, Tuple, Type
+import logging
+import traceback
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 10
+MAX_BACKOFF = 3600
+
+
+def enqueue_dispatches(
+        sender: Type[models.Model],
+        pks: Iterable,
+        created: bool = False,
+        using: Optional[str] = None
+) -> int:
+    """
+    Writes an outbox entry for every ready resource related to the
+    instances of sender whose primary key is in pks. The entries are
+    inserted with a single query in the current transaction. Returns the
+    number of entries.
+
+    :param sender:
+    :param pks:
+    :param created:
+    :param using:
+    :return:
+    """
+    from .models import Resource, ResourceDispatch
+
+    resources = Resource.objects.db_manager(using).all().related_to(
+        sender, pks
+    ).ready().values_list('pk', flat=True)
+    entries = ResourceDispatch.objects.db_manager(using).bulk_create([
+        ResourceDispatch(resource_id=pk, object_created=created)
+        for pk in resources
+    ])
+    return len(entries)
+
+
+def backoff(attempts: int) -> Optional[timezone.datetime]:
+    """
+    Returns the date of the next attempt to deliver an entry that has
+    failed attempts times, or None if it has to be given up.
+
+    :param attempts:
+    :return:
+    """
+    max_attempts = getattr(settings, 'SUBSCRIPTION_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    if attempts >= max_attempts:
+        return None
+    return timezone.now() + timezone.timedelta(seconds=min(2 ** attempts, MAX_BACKOFF))
+
+
+def deliver(entries: List) -> Tuple[int, int]:
+    """
+    Runs the callbacks of the outbox entries and refreshes the values
+    stored in their resources. Delivered entries are deleted, as well as
+    the entries of inactive resources or deleted objects. Failed entries
+    keep the error and are retried later. Returns the number of
+    delivered and failed entries.
+
+    :param entries:
+    :return:
+    """
+    from .models import ResourceDispatch
+    from .signals import refresh_snapshots, resolve_callback
+
+    pks = {}
+    for entry in entries:
+        resource = entry.resource
+        pks.setdefault(resource.content_type_id, set()).add(resource.object_pk)
+
+    instances = {}
+    for content_type_id, object_pks in pks.items():
+        model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+        for pk, instance in model_class._default_manager.in_bulk(list(object_pks)).items():
+            instances[(content_type_id, str(pk))] = instance
+
+    done, failed, delivered = [], [], []
+    for entry in entries:
+        resource = entry.resource
+        instance = instances.get((resource.content_type_id, resource.object_pk))
+        if instance is None or not resource.active:
+            done.append(entry.pk)
+            continue
+
+        resource.content_object = instance
+        try:
+            with transaction.atomic():
+                cb = resolve_callback(resource)
+                if cb is not None:
+                    if iscoroutinefunction(cb):
+                        cb = async_to_sync(cb)
+                    cb(
+                        sender=instance.__class__,
+                        instance=resource,
+                        created=entry.object_created,
+                        dispatch=entry
+                    )
+        except Exception:
+            entry.attempts += 1
+            entry.last_error = traceback.format_exc()
+            entry.available_at = backoff(entry.attempts)
+            failed.append(entry)
+            logger.warning(f'{entry} failed, attempt {entry.attempts}', exc_info=True)
+        else:
+            done.append(entry.pk)
+            delivered.append(resource)
+
+    refresh_snapshots(delivered)
+    ResourceDispatch.objects.filter(pk__in=done).delete()
+    ResourceDispatch.objects.bulk_update(failed, ['attempts', 'last_error', 'available_at'])
+
+    return len(delivered), len(failed)
+
+
+def drain(batch_size: int = 100, max_batches: Optional[int] = None) -> int:
+    """
+    Delivers the available outbox entries in batches of batch_size.
+    Each batch is locked with SELECT ... FOR UPDATE SKIP LOCKED in its
+    own transaction, so several workers can drain the outbox at the
+    same time without delivering an entry twice. Returns the number of
+    delivered entries.
+
+    :param batch_size:
+    :param max_batches:
+    :return:
+    """
+    from .models import ResourceDispatch
+
+    count, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            entries = list(
+                ResourceDispatch.objects.all().available().select_related(
+                    'resource'
+                ).select_for_update(skip_locked=True, of=('self',))[:batch_size]
+            )
+            if not entries:
+                break
+
+            delivered, _ = deliver(entries)
+
+        count += delivered
+        batches += 1
+
+    return count
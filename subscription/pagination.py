@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: each page is read with an
+    indexed range query from the cursor, so its cost does not depend on
+    how deep the page is.
+    """
+    ordering = ('id',)
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class StartCursorPagination(IdCursorPagination):
+    """
+    Keyset pagination on the start date, which leads the unique index
+    of the events, with the primary key to break ties.
+    """
+    ordering = ('start', 'id')
@@ -0,0 +1,32 @@
+from typing import Iterable, Iterator
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as newline delimited JSON, one object per line. The
+    lines can also be generated one at a time with stream, to send a
+    response whose size does not depend on the memory of the server.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+    render_style = 'binary'
+
+    def line(self, item) -> bytes:
+        return json.dumps(item, cls=JSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None) -> bytes:
+        if data is None:
+            return b''
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            data = data['results']
+        items = data if isinstance(data, list) else [data]
+        return b''.join(self.line(item) for item in items)
+
+    def stream(self, items: Iterable) -> Iterator[bytes]:
+        for item in items:
+            yield self.line(item)
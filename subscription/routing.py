@@ -0,0 +1,193 @@
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+import threading
+
+from django.conf import settings
+from django.core.cache import caches, BaseCache
+from django.db import transaction
+
+Route = Tuple[int, str]
+
+DEFAULT_CACHE_KEY = 'subscription:resource-index'
+
+
+class ResourceIndex:
+    """
+    Per-process index of the active resources keyed by the content type
+    and the primary key of their related object. It is loaded with a
+    single query on first use and dropped whenever a resource or a
+    subscription changes.
+
+    When the SUBSCRIPTION_ROUTING_CACHE setting names a cache alias, a
+    version number stored in that cache is used to drop the index of
+    every process sharing the cache.
+    """
+    def __init__(self, cache_key: str = DEFAULT_CACHE_KEY):
+        self.cache_key = cache_key
+        self._lock = threading.Lock()
+        self._routes: Optional[Dict[Route, FrozenSet[int]]] = None
+        self._version: Optional[int] = None
+        self._generation = 0
+        self._local = threading.local()
+
+    @property
+    def cache(self) -> Optional[BaseCache]:
+        alias = getattr(settings, 'SUBSCRIPTION_ROUTING_CACHE', None)
+        return caches[alias] if alias else None
+
+    def shared_version(self) -> Optional[int]:
+        """
+        Returns the version of the index shared between processes, if
+        a cache is configured.
+
+        :return:
+        """
+        cache = self.cache
+        if cache is not None:
+            return cache.get_or_set(self.cache_key, 0)
+
+    def load(self) -> Dict[Route, FrozenSet[int]]:
+        """
+        Returns the ids of the active resources grouped by the content
+        type and primary key of their related object.
+
+        :return:
+        """
+        from .models import Resource
+
+        routes = defaultdict(set)
+        queryset = Resource.objects.all().active().values_list(
+            'content_type_id', 'object_pk', 'pk'
+        )
+        for content_type_id, object_pk, pk in queryset:
+            routes[(content_type_id, object_pk)].add(pk)
+
+        return {route: frozenset(ids) for route, ids in routes.items()}
+
+    def pending(self) -> bool:
+        """
+        Checks if the index has been invalidated by the transaction of
+        the current thread and it has not been committed yet. An index
+        loaded meanwhile is not kept, as the transaction may be rolled
+        back.
+
+        :return:
+        """
+        block = getattr(self._local, 'block', None)
+        if block is not None and block in transaction.get_connection().atomic_blocks:
+            return True
+
+        self._local.block = None
+        self._local.routes = None
+        return False
+
+    def pending_routes(self) -> Dict[Route, FrozenSet[int]]:
+        """
+        Returns the index as seen by the pending transaction of the
+        current thread. It is kept for the thread until the index is
+        invalidated again or the atomic blocks change, as a savepoint
+        rollback may undo the changes it was loaded with.
+
+        :return:
+        """
+        blocks = list(transaction.get_connection().atomic_blocks)
+        cached = getattr(self._local, 'routes', None)
+        if cached is not None and cached[0] == blocks:
+            return cached[1]
+
+        routes = self.load()
+        self._local.routes = (blocks, routes)
+        return routes
+
+    @property
+    def routes(self) -> Dict[Route, FrozenSet[int]]:
+        if self.pending():
+            return self.pending_routes()
+
+        version = self.shared_version()
+        routes = self._routes
+        if routes is not None and version == self._version:
+            return routes
+
+        with self._lock:
+            generation = self._generation
+            routes = self.load()
+            if generation == self._generation:
+                self._routes, self._version = routes, version
+
+        return routes
+
+    def lookup(self, content_type_id: int, object_pk) -> FrozenSet[int]:
+        """
+        Returns the ids of the active resources related to the object.
+
+        :param content_type_id:
+        :param object_pk:
+        :return:
+        """
+        return self.routes.get((content_type_id, str(object_pk)), frozenset())
+
+    def watched(self, content_type_id: int, pks: Iterable) -> List:
+        """
+        Returns the primary keys, among pks, of the objects related to
+        active resources.
+
+        :param content_type_id:
+        :param pks:
+        :return:
+        """
+        routes = self.routes
+        return [pk for pk in pks if (content_type_id, str(pk)) in routes]
+
+    def clear(self) -> None:
+        """
+        Drops the index of the current process.
+
+        :return:
+        """
+        self._generation += 1
+        self._routes = None
+
+    def expire(self) -> None:
+        """
+        Drops the index of the current process and, if a cache is
+        configured, of every other process.
+
+        :return:
+        """
+        self.clear()
+        cache = self.cache
+        if cache is not None:
+            try:
+                cache.incr(self.cache_key)
+            except ValueError:
+                cache.set(self.cache_key, 1)
+
+    def commit(self) -> None:
+        """
+        Expires the index once the transaction that invalidated it has
+        been committed, so that no process keeps an index loaded before
+        the changes were visible.
+
+        :return:
+        """
+        self._local.block = None
+        self._local.routes = None
+        self.expire()
+
+    def invalidate(self) -> None:
+        """
+        Expires the index now and again when the current transaction is
+        committed.
+
+        :return:
+        """
+        self.expire()
+        self._local.routes = None
+        connection = transaction.get_connection()
+        if connection.atomic_blocks:
+            self._local.block = connection.atomic_blocks[0]
+            transaction.on_commit(self.commit)
+
+
+resource_index = ResourceIndex()
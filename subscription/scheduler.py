@@ -0,0 +1,327 @@
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple, Type
+import heapq
+import logging
+import threading
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+Occurrence = Tuple[timezone.datetime, Optional[timezone.datetime]]
+
+DEFAULT_HORIZON = timezone.timedelta(minutes=10)
+DEFAULT_REFILL_INTERVAL = timezone.timedelta(minutes=1)
+
+
+def guarded(callback: Callable) -> Callable:
+    """
+    Wraps callback so that an error is logged instead of raised, and a
+    failing callback does not prevent the others from being fired.
+
+    :param callback:
+    :return:
+    """
+    def wrapper():
+        try:
+            callback()
+        except Exception:
+            logger.exception('Scheduled callback failed')
+
+    return wrapper
+
+
+def fire(events: List, occurrences: Optional[Dict[int, Occurrence]] = None) -> int:
+    """
+    Runs the callbacks of the active resources of the events, passing
+    the bounds of the occurrence of each event, given by occurrences or
+    else by the next occurrence of the event. The objects related to
+    the resources are loaded with one query per content type. Returns
+    the number of fired resources.
+
+    :param events:
+    :param occurrences:
+    :return:
+    """
+    from .models import Resource
+    from .signals import callback_receiver, run_callbacks
+
+    events = {event.pk: event for event in events}
+    resources = [
+        resource
+        for resource in Resource.objects.all().active().filter(
+            subscription_event__in=list(events)
+        ).prefetch_related('content_object')
+        if resource.content_object is not None
+    ]
+
+    callbacks = []
+    for resource in resources:
+        event = events[resource.subscription_event_id]
+        occurrence = (occurrences or {}).get(event.pk) or (event.next_start, event.next_end)
+        callbacks.append(guarded(partial(
+            callback_receiver,
+            event.__class__,
+            resource,
+            occurrence=occurrence
+        )))
+    run_callbacks(callbacks)
+
+    return len(resources)
+
+
+def fire_due(date: Optional[timezone.datetime] = None, batch_size: int = 100) -> int:
+    """
+    Fires the resources of the events whose next occurrence has started
+    at date (the current date by default), in batches of batch_size
+    events. Each batch is locked with SELECT ... FOR UPDATE SKIP LOCKED,
+    and the start of the fired occurrence is stored in fired_start in
+    the same transaction, so an occurrence is fired once even with
+    several schedulers running. Returns the number of fired events.
+
+    :param date:
+    :param batch_size:
+    :return:
+    """
+    from .models import SubscriptionEvent
+
+    date = date or timezone.now()
+    count = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                SubscriptionEvent.objects.all().due(date).order_by(
+                    'next_start', 'pk'
+                ).select_for_update(skip_locked=True, of=('self',))[:batch_size]
+            )
+            if not events:
+                break
+
+            for event in events:
+                event.fired_start = event.next_start
+            SubscriptionEvent.objects.bulk_update(events, ['fired_start'])
+            fire(events)
+
+        count += len(events)
+
+    return count
+
+
+def claim(
+        model_class: Type[models.Model],
+        pk: int,
+        start: timezone.datetime
+) -> bool:
+    """
+    Moves the watermark of the event to start, unless an occurrence that
+    starts at or after start has already been fired. The update is
+    conditional, so only one scheduler can claim an occurrence, and the
+    row stays locked until the transaction of the caller ends.
+
+    :param model_class:
+    :param pk:
+    :param start:
+    :return:
+    """
+    return bool(
+        model_class.objects.filter(
+            models.Q(fired_start__isnull=True) | models.Q(fired_start__lt=start),
+            pk=pk,
+        ).update(fired_start=start)
+    )
+
+
+def starts_between(
+        event,
+        start: timezone.datetime,
+        end: timezone.datetime,
+        started: bool = False
+) -> List[Occurrence]:
+    """
+    Returns the bounds of the occurrences of the event that start
+    between start and end. If started is True, the occurrence in
+    progress at start is included as well.
+
+    :param event:
+    :param start:
+    :param end:
+    :param started:
+    :return:
+    """
+    occurrences = []
+    index = event.occurrence_index(start)
+    while event.occurrence_bounds(index)[0] < end:
+        occurrence = event.occurrence(index)
+        try:
+            occurrence.clean()
+        except ValidationError:
+            break
+
+        if started or occurrence.start >= start:
+            occurrences.append((occurrence.start, occurrence.end))
+        if not (event.end and event._recurrence):
+            break
+        index += 1
+
+    return occurrences
+
+
+class OccurrenceScheduler:
+    """
+    In-process scheduler of the occurrences that start within the next
+    horizon. The occurrences are computed from the events with active
+    resources, read with one query per refill, and kept in a heap
+    ordered by start date, so each occurrence is fired as soon as it
+    starts instead of on the next database poll. Each refill only
+    reads the period loaded since the previous one.
+
+    Occurrences are claimed through the fired_start watermark, shared
+    with fire_due, so an occurrence is fired once by any scheduler.
+    Events created or changed after their period has been loaded are
+    left to fire_due.
+    """
+    def __init__(
+            self,
+            model_class: Optional[Type[models.Model]] = None,
+            horizon: timezone.timedelta = DEFAULT_HORIZON,
+            refill_interval: timezone.timedelta = DEFAULT_REFILL_INTERVAL
+    ):
+        if model_class is None:
+            from .models import SubscriptionEvent
+            model_class = SubscriptionEvent
+
+        self.model_class = model_class
+        self.horizon = horizon
+        self.refill_interval = refill_interval
+        self.loaded_until: Optional[timezone.datetime] = None
+        self.refilled_at: Optional[timezone.datetime] = None
+        self._heap: List[Tuple[timezone.datetime, int, Optional[timezone.datetime]]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def candidates(self, start: timezone.datetime, end: timezone.datetime) -> models.QuerySet:
+        """
+        Returns the events with active resources that may have an
+        occurrence starting between start and end.
+
+        :param start:
+        :param end:
+        :return:
+        """
+        return self.model_class.objects.filter(
+            models.Q(subscription_line__end__isnull=True) |
+            models.Q(subscription_line__end__gt=start),
+            models.Q(recurrence__gt=timezone.timedelta(0)) |
+            models.Q(end__isnull=True) |
+            models.Q(end__gt=start),
+            start__lt=end,
+            resource__active=True,
+            subscription_line__subscription__active=True,
+        ).distinct().select_related('subscription_line')
+
+    def refill(self, now: Optional[timezone.datetime] = None) -> int:
+        """
+        Loads the occurrences that start between the end of the loaded
+        period and now plus the horizon. The first refill also loads
+        the occurrences in progress. Returns the number of loaded
+        occurrences.
+
+        :param now:
+        :return:
+        """
+        now = now or timezone.now()
+        start, end = self.loaded_until or now, now + self.horizon
+        self.refilled_at = now
+        if end <= start:
+            return 0
+
+        count = 0
+        for event in self.candidates(start, end):
+            for occurrence in starts_between(event, start, end, self.loaded_until is None):
+                heapq.heappush(self._heap, (occurrence[0], event.pk, occurrence[1]))
+                count += 1
+
+        self.loaded_until = end
+        return count
+
+    def pop_due(self, now: timezone.datetime) -> Dict[int, Occurrence]:
+        """
+        Pops the occurrences that have started at now. Only the latest
+        one of each event is returned, as long as it has not ended.
+
+        :param now:
+        :return:
+        """
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            start, pk, end = heapq.heappop(self._heap)
+            due[pk] = (start, end)
+
+        return {
+            pk: (start, end)
+            for pk, (start, end) in due.items()
+            if end is None or now < end
+        }
+
+    def run_pending(self, now: Optional[timezone.datetime] = None) -> int:
+        """
+        Refills the heap if the refill interval has elapsed, and fires
+        the occurrences that have started and can be claimed. The claims
+        and the callbacks run in the same transaction, so if firing
+        fails the watermarks are rolled back and fire_due fires the
+        occurrences later. Returns the number of fired events.
+
+        :param now:
+        :return:
+        """
+        now = now or timezone.now()
+        if self.refilled_at is None or now - self.refilled_at >= self.refill_interval:
+            self.refill(now)
+
+        due = self.pop_due(now)
+        if not due:
+            return 0
+
+        with transaction.atomic():
+            occurrences = {
+                pk: occurrence
+                for pk, occurrence in due.items()
+                if claim(self.model_class, pk, occurrence[0])
+            }
+            if occurrences:
+                events = self.model_class.objects.in_bulk(list(occurrences))
+                fire(list(events.values()), occurrences)
+
+        return len(occurrences)
+
+    def timeout(self, now: Optional[timezone.datetime] = None) -> float:
+        """
+        Returns the seconds until the next occurrence starts or the next
+        refill is due, whichever comes first.
+
+        :param now:
+        :return:
+        """
+        now = now or timezone.now()
+        wake = (self.refilled_at or now) + self.refill_interval
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max(0.0, (wake - now).total_seconds())
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        """
+        Fires the occurrences as they start until stop is set.
+
+        :param stop:
+        :return:
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception('Scheduler iteration failed')
+            stop.wait(self.timeout())
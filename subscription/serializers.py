@@ -1,37 +1,176 @@
+from collections import OrderedDict
+from typing import ClassVar
+import threading
+
+from django.db import transaction
 from rest_framework import serializers
 
+from .bulk import bulk_saved, prepare
+
 from .models import Subscription, SubscriptionEvent, SubscriptionLine, Resource
 
 
 class GenericSerializer(serializers.ModelSerializer):
+    cache_size: ClassVar[int] = 128
+    _classes: ClassVar[OrderedDict] = OrderedDict()
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def for_model(cls, model_class, content_object_fields):
+        """
+        Returns a distinct serializer class for the model and fields. The
+        classes are cached, so the field mapping is introspected once,
+        and the least recently used ones are evicted beyond cache_size.
+
+        :param model_class:
+        :param content_object_fields:
+        :return:
+        """
+        fields = content_object_fields \
+            if isinstance(content_object_fields, str) \
+            else tuple(content_object_fields)
+        key = (cls, model_class, fields)
+
+        with cls._lock:
+            serializer_class = cls._classes.get(key)
+            if serializer_class is None:
+                serializer_class = type(f'{model_class.__name__}Serializer', (cls,), {
+                    '__module__': cls.__module__,
+                    'Meta': type('Meta', (), {
+                        'model': model_class,
+                        'fields': fields
+                    })
+                })
+                cls._classes[key] = serializer_class
+                while len(cls._classes) > cls.cache_size:
+                    cls._classes.popitem(last=False)
+            else:
+                cls._classes.move_to_end(key)
+
+        return serializer_class
+
     @classmethod
     def from_model(cls, model_class, content_object_fields, *args, **kwargs):
-        cls.Meta = type('Meta', (), {
-            'model': model_class,
-            'fields': content_object_fields
-        })
-        return cls(*args, **kwargs)
+        return cls.for_model(model_class, content_object_fields)(*args, **kwargs)
+
+    @classmethod
+    def snapshot(cls, model_class, content_object_fields, instance) -> dict:
+        """
+        Returns the values of the fields of instance. A single serializer
+        of each class is kept to build the representation, so the fields
+        are bound once instead of on every snapshot.
+
+        :param model_class:
+        :param content_object_fields:
+        :param instance:
+        :return:
+        """
+        serializer_class = cls.for_model(model_class, content_object_fields)
+        serializer = serializer_class.__dict__.get('_prototype')
+        if serializer is None:
+            serializer = serializer_class()
+            # Binds the fields before sharing the serializer between threads.
+            serializer.fields
+            serializer_class._prototype = serializer
+
+        return dict(serializer.to_representation(instance))
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    List serializer that writes a whole batch with a single bulk_create
+    or bulk_update in one transaction, and runs what the post_save
+    receivers would do once for the batch. For updates, instance is a
+    mapping of the instances by primary key, given as a string, and
+    each item is validated against the instance of its id.
+    """
+    def to_internal_value(self, data):
+        self.matched = []
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        if self.instance is None:
+            return super().run_child_validation(data)
+
+        pk = data.get('id') if isinstance(data, dict) else None
+        instance = self.instance.get(str(pk))
+        if instance is None:
+            raise serializers.ValidationError({'id': [f'Object with id={pk} does not exist']})
+
+        self.child.instance = instance
+        self.child.initial_data = data
+        try:
+            attrs = super().run_child_validation(data)
+        finally:
+            self.child.instance = None
+        self.matched.append(instance)
+        return attrs
+
+    def create(self, validated_data):
+        model_class = self.child.Meta.model
+        instances = [model_class(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            prepare(instances)
+            model_class._default_manager.bulk_create(instances)
+            bulk_saved(model_class, instances, created=True)
+        return instances
+
+    def update(self, instance, validated_data):
+        model_class = self.child.Meta.model
+        content_type_ids = {
+            getattr(obj, 'content_type_id', None) for obj in self.matched
+        } - {None}
+
+        instances, fields = [], set()
+        for obj, attrs in zip(self.matched, validated_data):
+            for name, value in attrs.items():
+                setattr(obj, name, value)
+            fields.update(attrs)
+            instances.append(obj)
+
+        fields.update(
+            field.name for field in model_class._meta.concrete_fields
+            if field.name in ('next_start', 'next_end', 'exhausted', 'content_object_fields')
+        )
+        with transaction.atomic():
+            prepare(instances)
+            if fields:
+                model_class._default_manager.bulk_update(instances, list(fields))
+            bulk_saved(model_class, instances, content_type_ids=content_type_ids)
+        return instances
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
+    display_name = serializers.CharField(source='__str__', read_only=True)
+
     class Meta:
         model = Subscription
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
 
 
 class SubscriptionLineSerializer(serializers.ModelSerializer):
+    display_name = serializers.CharField(source='__str__', read_only=True)
+
     class Meta:
         model = SubscriptionLine
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
 
 
 class SubscriptionEventSerializer(serializers.ModelSerializer):
+    display_name = serializers.CharField(source='__str__', read_only=True)
+
     class Meta:
         model = SubscriptionEvent
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
 
 
 class ResourceSerializer(serializers.ModelSerializer):
+    display_name = serializers.CharField(source='__str__', read_only=True)
+
     class Meta:
         model = Resource
         fields = '__all__'
+        list_serializer_class = BulkListSerializer
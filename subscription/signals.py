@@ -1,28 +1,312 @@
-from typing import Type
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict, Iterable, Optional, Tuple, Type
+import asyncio
+import operator
 import warnings
 
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.utils.module_loading import import_string
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .bulk import defer_routing
+from .callbacks import callback_registry
+from .executors import callback_executor
+from .outbox import enqueue_dispatches
+from .routing import resource_index
+from .transactions import TransactionBuffer
+
+ROUTING_FIELDS = {'active', 'content_type', 'object_pk', 'subscription_event'}
+
+SYNC_DISPATCH = 'sync'
+ASYNC_DISPATCH = 'async'
+COMMIT_DISPATCH = 'commit'
+CELERY_DISPATCH = 'celery'
+OUTBOX_DISPATCH = 'outbox'
+
+Buffered = Tuple[Type[models.Model], models.Model, bool]
+
+
+def changes_routing(sender: Type[models.Model], update_fields: Optional[Iterable[str]]) -> bool:
+    """
+    Checks if a save with update_fields may change which resources
+    watch which objects. Field names and attnames are both accepted.
+
+    :param sender:
+    :param update_fields:
+    :return:
+    """
+    if update_fields is None:
+        return True
+
+    opts = sender._meta
+    return bool(ROUTING_FIELDS & {opts.get_field(name).name for name in update_fields})
+
+
+def dispatch_mode() -> str:
+    return getattr(settings, 'SUBSCRIPTION_DISPATCH', SYNC_DISPATCH)
+
+
+def resolve_callback(instance) -> Optional[Callable]:
+    """
+    Returns the callback of instance, or None if it has none or it is
+    not callable.
+
+    :param instance:
+    :return:
+    """
+    if not getattr(instance, 'callback', None):
+        return None
+
+    cb = callback_registry.resolve(instance.callback)
+    if not callable(cb):
+        warnings.warn(
+            f'Resource {instance} has an invalid callback value: {instance.callback}',
+            ImportWarning
+        )
+        return None
+
+    return cb
 
 
 def callback_receiver(sender, instance, **kwargs):
     try:
-        cb = import_string(instance.callback)
-        if callable(cb):
-            cb(**{
-                'sender': sender,
-                'instance': instance,
-                **kwargs
-            })
-        else:
-            warnings.warn(
-                f'Resource {instance} has an invalid callback value: {instance.callback}',
-                ImportWarning
-            )
+        cb = resolve_callback(instance)
+        if cb is None:
+            return
+
+        if iscoroutinefunction(cb):
+            cb = async_to_sync(cb)
+        cb(**{
+            'sender': sender,
+            'instance': instance,
+            **kwargs
+        })
+    except (ImportError, TypeError, AttributeError):
+        pass
+
+
+async def acallback_receiver(sender, instance, **kwargs):
+    """
+    Awaits the callback of instance if it is a coroutine function, or
+    runs it with sync_to_async otherwise. Plain callbacks are thread
+    sensitive: they run one after another in the thread of the caller,
+    where they share its database connection and transaction.
+
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    try:
+        cb = resolve_callback(instance)
+        if cb is None:
+            return
+
+        if not iscoroutinefunction(cb):
+            cb = sync_to_async(cb)
+        await cb(**{
+            'sender': sender,
+            'instance': instance,
+            **kwargs
+        })
     except (ImportError, TypeError, AttributeError):
         pass
 
 
+def refresh_snapshots(resources: Iterable) -> None:
+    """
+    Refreshes the values stored in the resources from their related
+    object. Each object is serialized once per set of stored fields,
+    resources whose values have not changed are not written, and the
+    others are written with an update per object and set of fields.
+
+    :param resources:
+    :return:
+    """
+    from .models import Resource
+
+    snapshots = {}
+    changed = defaultdict(list)
+    for resource in resources:
+        fields = resource.get_snapshot_fields()
+        key = (
+            resource.content_type_id,
+            resource.object_pk,
+            fields if isinstance(fields, str) else tuple(fields)
+        )
+        if key not in snapshots:
+            snapshots[key] = resource.get_values_from_related_object(
+                resource.content_type.model_class()
+            )
+        if resource.get_stored_values() != dict(snapshots[key]):
+            resource.content_object_fields = snapshots[key]
+            changed[key].append(resource.pk)
+
+    for key, pks in changed.items():
+        Resource.objects.filter(pk__in=pks).update(content_object_fields=snapshots[key])
+
+
+def run_callbacks(callbacks: Iterable[Callable], pooled: bool = False) -> None:
+    """
+    Runs the callbacks one after another in the calling thread or, if
+    pooled is True and the callback executor is enabled, concurrently in
+    its thread pool. The pool threads use their own database
+    connections, so only callbacks dispatched once the changes are
+    committed can be pooled.
+
+    :param callbacks:
+    :param pooled:
+    :return:
+    """
+    if pooled and callback_executor.enabled:
+        callback_executor.run(list(callbacks))
+        return
+
+    for callback in callbacks:
+        callback()
+
+
+def dispatch_instances(
+        sender: Type[models.Model],
+        instances: Dict[str, models.Model],
+        pooled: bool = False,
+        **kwargs
+) -> int:
+    """
+    Calls the callback of every ready resource related to the instances,
+    keyed by their primary key as a string, and refreshes the values
+    stored in the resources once every callback has been called. The
+    resources are resolved with a single query. If pooled is True and
+    the callback executor is enabled, the callbacks are run concurrently
+    in its thread pool; this is only done once the changes have been
+    committed ('commit' and 'celery' dispatch). Returns the number of
+    dispatched resources.
+
+    :param sender:
+    :param instances:
+    :param pooled:
+    :param kwargs:
+    :return:
+    """
+    from .models import Resource
+
+    queryset = Resource.objects.all().related_to(sender, instances)
+    resources = list(queryset.ready())
+    for resource in resources:
+        resource.content_object = instances[resource.object_pk]
+
+    run_callbacks([
+        partial(callback_receiver, sender, resource, queryset=queryset, **kwargs)
+        for resource in resources
+    ], pooled=pooled)
+    refresh_snapshots(resources)
+
+    return len(resources)
+
+
+async def adispatch_instances(
+        sender: Type[models.Model],
+        instances: Dict[str, models.Model],
+        **kwargs
+) -> int:
+    """
+    Asynchronous version of dispatch_instances. The ready resources are
+    resolved with the async ORM interface and their coroutine callbacks
+    are run concurrently, while plain callbacks still run one at a time
+    (see acallback_receiver). The stored values are refreshed once all
+    of them have finished.
+
+    :param sender:
+    :param instances:
+    :param kwargs:
+    :return:
+    """
+    from .models import Resource
+
+    # Fills the content type cache, which related_to reads synchronously.
+    await sync_to_async(ContentType.objects.get_for_model)(sender)
+
+    queryset = Resource.objects.all().related_to(sender, instances)
+    resources = [resource async for resource in queryset.ready()]
+    for resource in resources:
+        resource.content_object = instances[resource.object_pk]
+
+    await asyncio.gather(*(
+        acallback_receiver(sender, resource, queryset=queryset, **kwargs)
+        for resource in resources
+    ))
+    await sync_to_async(refresh_snapshots)(resources)
+
+    return len(resources)
+
+
+def dispatch_resources(
+        sender: Type[models.Model],
+        instance: models.Model,
+        **kwargs
+) -> None:
+    """
+    Calls the callback of every ready resource related to the instance
+    and refreshes the values stored in the resource.
+
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    dispatch_instances(sender, {str(instance.pk): instance}, **kwargs)
+
+
+def enqueue_objects(objects: Dict[Tuple[int, str], bool]) -> None:
+    """
+    Sends the objects saved in a transaction, with a flag telling if
+    any of the saves created the object, to a single Celery task.
+
+    :param objects:
+    :return:
+    """
+    from .tasks import dispatch_objects
+
+    dispatch_objects.delay([
+        [content_type_id, object_pk, created]
+        for (content_type_id, object_pk), created in objects.items()
+    ])
+
+
+celery_buffer = TransactionBuffer(enqueue_objects, merge=operator.or_)
+
+
+def dispatch_buffered(objects: Dict[Tuple[int, str], Buffered]) -> int:
+    """
+    Dispatches the objects saved in a transaction, given as (sender,
+    instance, created) items, with one call to dispatch_instances per
+    sender and created flag. Returns the number of dispatched objects.
+
+    :param objects:
+    :return:
+    """
+    groups = defaultdict(dict)
+    for (_, object_pk), (sender, instance, created) in objects.items():
+        groups[(sender, created)][object_pk] = instance
+
+    for (sender, created), instances in groups.items():
+        dispatch_instances(sender, instances, pooled=True, created=created)
+
+    return len(objects)
+
+
+def merge_buffered(old: Buffered, new: Buffered) -> Buffered:
+    sender, instance, created = new
+    return sender, instance, old[2] or created
+
+
+commit_buffer = TransactionBuffer(dispatch_buffered, merge=merge_buffered)
+
+
 def default_receiver(
         sender: Type[models.Model],
         instance: models.Model,
@@ -32,15 +316,120 @@ def default_receiver(
     Converts resource dotted path to callable object and call it
     with current context.
 
+    If the SUBSCRIPTION_DISPATCH setting is 'commit', the instance is
+    buffered until the transaction is committed, and the callbacks are
+    run once per instance and transaction. If it is 'celery', they are
+    run by a Celery task instead. If it is 'async', the coroutine
+    callbacks of the instance are run concurrently in an event loop.
+    If it is 'outbox', an outbox entry is written for each ready
+    resource in the current transaction, and delivered later by
+    drain_dispatches.
+    Otherwise ('sync'), the callbacks run inline, in the transaction of
+    the save, even if the callback executor is enabled.
+
     :param sender:
     :param instance:
     :param kwargs:
     :return:
     """
-    from .models import Resource
+    content_type = ContentType.objects.get_for_model(instance)
+    if not resource_index.lookup(content_type.pk, instance.pk):
+        return
+
+    mode = dispatch_mode()
+    key = (content_type.pk, str(instance.pk))
+    created = bool(kwargs.get('created'))
+    if mode == CELERY_DISPATCH:
+        celery_buffer.add(key, created, using=kwargs.get('using'))
+    elif mode == COMMIT_DISPATCH:
+        commit_buffer.add(key, (sender, instance, created), using=kwargs.get('using'))
+    elif mode == OUTBOX_DISPATCH:
+        enqueue_dispatches(sender, [instance.pk], created, using=kwargs.get('using'))
+    elif mode == ASYNC_DISPATCH:
+        async_to_sync(adispatch_instances)(sender, {str(instance.pk): instance}, **kwargs)
+    else:
+        dispatch_resources(sender, instance, **kwargs)
+
+
+def notify_objects(
+        sender: Type[models.Model],
+        pks: Iterable,
+        created: bool = False,
+        using: Optional[str] = None,
+        batch_size: int = 1000
+) -> int:
+    """
+    Dispatches the objects of sender changed by a bulk operation, as
+    default_receiver does for a single save. Objects without active
+    resources are skipped, and the others are loaded and dispatched in
+    batches of batch_size objects. Returns the number of dispatched
+    objects, or of buffered ones if SUBSCRIPTION_DISPATCH is 'commit'
+    or 'celery'. If it is 'outbox', the outbox entries of each batch are
+    written with a single query and the number of objects is returned.
+
+    :param sender:
+    :param pks:
+    :param created:
+    :param using:
+    :param batch_size:
+    :return:
+    """
+    content_type = ContentType.objects.get_for_model(sender)
+    pks = resource_index.watched(content_type.pk, pks)
+
+    mode = dispatch_mode()
+    if mode == CELERY_DISPATCH:
+        for pk in pks:
+            celery_buffer.add((content_type.pk, str(pk)), created, using=using)
+        return len(pks)
+
+    if mode == OUTBOX_DISPATCH:
+        for i in range(0, len(pks), batch_size):
+            enqueue_dispatches(sender, pks[i:i + batch_size], created, using=using)
+        return len(pks)
+
+    count = 0
+    manager = sender._default_manager.db_manager(using)
+    for i in range(0, len(pks), batch_size):
+        instances = manager.in_bulk(pks[i:i + batch_size])
+        count += len(instances)
+        if mode == COMMIT_DISPATCH:
+            for pk, instance in instances.items():
+                commit_buffer.add(
+                    (content_type.pk, str(pk)),
+                    (sender, instance, created),
+                    using=using
+                )
+        else:
+            dispatch = async_to_sync(adispatch_instances) \
+                if mode == ASYNC_DISPATCH else dispatch_instances
+            dispatch(
+                sender,
+                {str(pk): instance for pk, instance in instances.items()},
+                created=created,
+                using=using
+            )
+
+    return count
+
+
+@receiver(post_save, sender='subscription.Resource')
+@receiver(post_delete, sender='subscription.Resource')
+@receiver(post_save, sender='subscription.Subscription')
+@receiver(post_delete, sender='subscription.Subscription')
+def resource_index_receiver(sender: Type[models.Model], **kwargs) -> None:
+    """
+    Invalidates the resource index when a resource or a subscription
+    changes, unless the saved fields cannot modify the index or the
+    invalidation is deferred to the end of a bulk delete.
+
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    if not changes_routing(sender, kwargs.get('update_fields')):
+        return
+    if defer_routing():
+        return
 
-    queryset = Resource.objects.all().related_objects(instance)
-    for resource in queryset:
-        if resource.is_ready:
-            callback_receiver(sender, resource, queryset=queryset, **kwargs)
-            resource.save()
+    resource_index.invalidate()
@@ -0,0 +1,79 @@
+from typing import List, Optional
+
+from celery import shared_task
+from django.contrib.contenttypes.models import ContentType
+
+from .models import SubscriptionEvent
+from .outbox import drain
+from .scheduler import fire_due
+from .signals import dispatch_instances
+
+
+@shared_task
+def advance_events(batch_size: int = 1000) -> int:
+    """
+    Moves the next occurrence of the stale subscription events forward.
+
+    :param batch_size:
+    :return:
+    """
+    return SubscriptionEvent.objects.all().advance(batch_size=batch_size)
+
+
+@shared_task
+def dispatch_objects(objects: List[List]) -> int:
+    """
+    Runs the callbacks of the ready resources related to each object,
+    given as [content type id, object pk, created] items. Objects
+    deleted since they were saved are skipped, and the resources of the
+    objects of each content type are resolved together. Returns the
+    number of dispatched objects.
+
+    :param objects:
+    :return:
+    """
+    created = {}
+    for content_type_id, object_pk, flag in objects:
+        created.setdefault(content_type_id, {})[object_pk] = flag
+
+    count = 0
+    for content_type_id, pks in created.items():
+        model_class = ContentType.objects.get_for_id(content_type_id).model_class()
+        instances = model_class._default_manager.in_bulk(list(pks))
+        for flag in (False, True):
+            group = {
+                str(pk): instance
+                for pk, instance in instances.items()
+                if pks[str(pk)] is flag
+            }
+            if group:
+                dispatch_instances(model_class, group, pooled=True, created=flag)
+        count += len(instances)
+
+    return count
+
+
+@shared_task
+def drain_dispatches(batch_size: int = 100, max_batches: Optional[int] = None) -> int:
+    """
+    Delivers the available outbox entries. Several workers can run it
+    at the same time.
+
+    :param batch_size:
+    :param max_batches:
+    :return:
+    """
+    return drain(batch_size=batch_size, max_batches=max_batches)
+
+
+@shared_task
+def fire_events(batch_size: int = 100) -> int:
+    """
+    Moves the next occurrence of the stale subscription events forward
+    and fires the resources of the occurrences that have started.
+
+    :param batch_size:
+    :return:
+    """
+    SubscriptionEvent.objects.all().advance()
+    return fire_due(batch_size=batch_size)
@@ -1,8 +1,55 @@
 from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from subscription.models import Resource
 
 
 class ResourceTestCase(TestCase):
     fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.resource = Resource.objects.get(id=1)
+        self.resource.save()
+        self.resource.refresh_from_db()
+
+    def test_snapshot_fields(self):
+        self.assertIn('username', self.resource.get_snapshot_fields())
+        self.assertEqual(Resource(content_object_fields='').get_snapshot_fields(), '__all__')
+
+    def test_unchanged_snapshot_is_not_written(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertFalse(self.resource.refresh_snapshot())
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ])
+
+    def test_unchanged_snapshot_values(self):
+        values = self.resource.get_stored_values()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.resource.refresh_snapshot(values))
+
+    def test_changed_snapshot_is_written(self):
+        User.objects.filter(id=1).update(first_name='changed')
+        self.assertTrue(self.resource.refresh_snapshot())
+
+        self.resource.refresh_from_db()
+        self.assertEqual(self.resource.get_stored_values()['first_name'], 'changed')
+
+    def test_snapshot_keys_can_be_queried(self):
+        self.assertQuerySetEqual(
+            Resource.objects.filter(content_object_fields__username='user'),
+            [self.resource]
+        )
+
+    def test_clean_rejects_non_mapping_values(self):
+        self.resource.content_object_fields = ['username']
+        self.assertRaises(ValidationError, self.resource.clean)
+
+    def test_clean_rejects_unknown_fields(self):
+        self.resource.content_object_fields = {'unknown': 1}
+        self.assertRaises(ValidationError, self.resource.clean)
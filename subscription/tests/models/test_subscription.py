@@ -1,10 +1,11 @@
+import itertools
 from unittest import mock
 
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 from django.utils import timezone
 
-from subscription.models import SubscriptionEvent
+from subscription.models import SubscriptionEvent, MonthlySubscriptionEvent, DailySubscriptionEvent
 
 
 class SubscriptionEventTestCase(TestCase):
@@ -157,3 +158,109 @@ class SubscriptionEventTestCase(TestCase):
         self.assertEqual(len(events), 3)
         duration = events[-1].end - events[-1].start
         self.assertEqual(divmod(duration.total_seconds(), 60)[0], 1320)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_recurring_event_occurrence(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=2)
+        mock_now.return_value = event.start + timezone.timedelta(days=3, hours=12)
+        current = event.current
+        self.assertEqual(current.start, event.start + timezone.timedelta(days=3))
+        self.assertEqual(current.end, event.end + timezone.timedelta(days=3))
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_recurring_event_with_resize(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=3)
+        mock_now.return_value = event.subscription_line.end - timezone.timedelta(minutes=1)
+        current = event.current
+        self.assertEqual(current.start, event.start + timezone.timedelta(hours=50))
+        self.assertEqual(current.end, event.subscription_line.end)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_recurring_event_between_occurrences(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=3)
+        mock_now.return_value = event.end + timezone.timedelta(minutes=30)
+        self.assertIsNone(event.current)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_recurring_event_after_line_end(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=2)
+        mock_now.return_value = event.subscription_line.end
+        self.assertIsNone(event.current)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_recurring_event_from_current_occurrence(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=2)
+        mock_now.return_value = event.start + timezone.timedelta(days=3, hours=12)
+        events = list(event.events)
+        self.assertEqual(len(events), 7)
+        self.assertEqual(events[0].start, event.start + timezone.timedelta(days=3))
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_does_not_depend_on_event_age(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=2)
+        event.subscription_line.end = None
+
+        for days in (1, 10, 10000):
+            mock_now.return_value = event.start + timezone.timedelta(days=days, hours=1)
+            with mock.patch.object(SubscriptionEvent, 'clean', autospec=True) as clean:
+                current = event.current
+            self.assertEqual(clean.call_count, 1)
+            self.assertEqual(current.start, event.start + timezone.timedelta(days=days))
+
+    @mock.patch('django.utils.timezone.now')
+    def test_save_sets_next_occurrence(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=2)
+        mock_now.return_value = event.end + timezone.timedelta(hours=1)
+        event.save()
+        self.assertEqual(event.next_start, event.start + timezone.timedelta(days=1))
+        self.assertEqual(event.next_end, event.end + timezone.timedelta(days=1))
+
+        event.save(update_fields=['recurrence'])
+        event.refresh_from_db()
+        self.assertEqual(event.next_start, event.start + timezone.timedelta(days=1))
+
+
+class MonthlySubscriptionEventTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.event = MonthlySubscriptionEvent.objects.get(id=2)
+        self.event.subscription_line.end = None
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_month(self, mock_now):
+        mock_now.return_value = self.event.start.replace(year=2021, month=2, day=14)
+        current = self.event.current
+        self.assertEqual(current.start, self.event.start.replace(year=2021, month=2, day=1))
+        self.assertEqual(current.end, self.event.start.replace(year=2021, month=2, day=28))
+
+    @mock.patch('django.utils.timezone.now')
+    def test_last_day_of_month(self, mock_now):
+        mock_now.return_value = self.event.start.replace(month=2, day=29, hour=23)
+        self.assertIsNone(self.event.current)
+
+    @mock.patch('django.utils.timezone.now')
+    def test_events_from_current_month(self, mock_now):
+        mock_now.return_value = self.event.start.replace(month=3, day=3)
+        events = itertools.islice(self.event.events, 3)
+        self.assertListEqual(
+            [event.start.month for event in events],
+            [3, 4, 5]
+        )
+
+
+class DailySubscriptionEventTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.event = DailySubscriptionEvent.objects.get(id=3)
+        self.event.subscription_line.end = None
+
+    @mock.patch('django.utils.timezone.now')
+    def test_current_day(self, mock_now):
+        mock_now.return_value = self.event.start + timezone.timedelta(days=400, hours=6)
+        current = self.event.current
+        self.assertEqual(current.start, self.event.start + timezone.timedelta(days=400))
+        self.assertEqual(current.end, self.event.start + timezone.timedelta(days=401))
@@ -0,0 +1,269 @@
+import json
+
+from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from subscription.api import (
+    ResourceViewSet, SubscriptionEventViewSet, SubscriptionLineViewSet, SubscriptionViewSet
+)
+from subscription.models import Resource, Subscription, SubscriptionEvent, SubscriptionLine
+from subscription.routing import resource_index
+from subscription.wiring import signal_wiring
+
+BULK_ACTIONS = {'post': 'bulk_create', 'patch': 'bulk_partial_update', 'delete': 'bulk_destroy'}
+
+
+class BulkWriteTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.users = User.objects.bulk_create([
+            User(username=f'bulk-{i}') for i in range(10)
+        ])
+
+    def request(self, viewset, method, data):
+        request = getattr(self.factory, method)('/bulk/', data, format='json')
+        return viewset.as_view(BULK_ACTIONS)(request)
+
+    def resources(self, users):
+        return [
+            {'content_type': 4, 'object_pk': str(user.pk), 'subscription_event': 1}
+            for user in users
+        ]
+
+    def test_bulk_create(self):
+        response = self.request(SubscriptionEventViewSet, 'post', [
+            {'start': '2020-02-01T12:00:00Z', 'end': None, 'subscription_line': 1},
+            {'start': '2020-03-01T12:00:00Z', 'end': '2020-03-02T12:00:00Z',
+             'recurrence': '2 00:00:00', 'subscription_line': 1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        self.assertIsNotNone(SubscriptionEvent.objects.get(pk=response.data[1]['id']).next_start)
+
+    def test_invalid_batch_is_not_written(self):
+        response = self.request(SubscriptionEventViewSet, 'post', [
+            {'start': '2020-02-01T12:00:00Z', 'end': None, 'subscription_line': 1},
+            {'start': 'tomorrow', 'end': None, 'subscription_line': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('start', response.data[1])
+        self.assertEqual(SubscriptionEvent.objects.count(), 3)
+
+    def test_bulk_create_resources(self):
+        signal_wiring.setup()
+        self.addCleanup(signal_wiring.reset)
+        signal_wiring.disconnect(User)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(ResourceViewSet, 'post', self.resources(self.users))
+        self.assertEqual(response.status_code, 201)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        resource = Resource.objects.get(pk=response.data[0]['id'])
+        self.assertEqual(resource.content_object_fields['username'], 'bulk-0')
+        self.assertTrue(signal_wiring.watches(User))
+
+    def test_bulk_create_query_count(self):
+        counts = []
+        for users in (self.users[:2], self.users[2:]):
+            with CaptureQueriesContext(connection) as queries:
+                self.request(ResourceViewSet, 'post', self.resources(users))
+            counts.append(len([q for q in queries if 'auth_user' in q['sql']]))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_partial_update(self):
+        response = self.request(ResourceViewSet, 'patch', [
+            {'id': 1, 'active': False},
+            {'id': '2', 'callback': 'subscription.tests.utils.dummy'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Resource.objects.get(pk=1).active)
+        self.assertEqual(Resource.objects.get(pk=2).callback, 'subscription.tests.utils.dummy')
+
+    def test_bulk_partial_update_invalidates_index(self):
+        resource_index.lookup(4, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request(SubscriptionViewSet, 'patch', [{'id': 1, 'active': False}])
+        self.assertFalse(Subscription.objects.get(pk=1).active)
+        self.assertSetEqual(resource_index.lookup(4, 1), set())
+
+    def test_bulk_partial_update_unknown_id(self):
+        response = self.request(ResourceViewSet, 'patch', [{'id': 100, 'active': False}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.data[0])
+
+    def test_bulk_destroy(self):
+        response = self.request(ResourceViewSet, 'delete', [1, '2', 'x'])
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Resource.objects.exists())
+
+    def test_bulk_destroy_query_count(self):
+        signal_wiring.setup()
+        self.addCleanup(signal_wiring.reset)
+        Resource.objects.filter(content_type=4).delete()
+
+        counts = []
+        for users in (self.users[:2], self.users[2:]):
+            resources = Resource.objects.bulk_create([
+                Resource(content_type_id=4, object_pk=str(user.pk), subscription_event_id=1)
+                for user in users
+            ])
+            signal_wiring.connect(User)
+            resource_index.lookup(4, users[0].pk)
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.request(ResourceViewSet, 'delete', [resource.pk for resource in resources])
+            counts.append(len(queries))
+            self.assertFalse(signal_wiring.watches(User))
+            self.assertSetEqual(resource_index.lookup(4, users[0].pk), set())
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_destroy_expects_a_list(self):
+        response = self.request(ResourceViewSet, 'delete', {'id': 1})
+        self.assertEqual(response.status_code, 400)
+
+
+class RelatedRowsMixin:
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.rows = 0
+
+    def populate(self, rows):
+        """
+        Adds related users, groups, subscriptions, lines, events and
+        resources until each table has rows rows.
+        """
+        user_type = ContentType.objects.get_for_model(User)
+        group_type = ContentType.objects.get_for_model(Group)
+        indexes = range(self.rows, rows)
+        users = User.objects.bulk_create([User(username=f'user-{i}') for i in indexes])
+        groups = Group.objects.bulk_create([Group(name=f'group-{i}') for i in indexes])
+        subscriptions = Subscription.objects.bulk_create([
+            Subscription(name=f'subscription-{i}', content_type=user_type, object_pk=str(user.pk))
+            for i, user in zip(indexes, users)
+        ])
+        lines = SubscriptionLine.objects.bulk_create([
+            SubscriptionLine(start='2020-01-01T12:00:00Z', subscription=subscription)
+            for subscription in subscriptions
+        ])
+        events = SubscriptionEvent.objects.bulk_create([
+            SubscriptionEvent(start='2020-01-01T12:00:00Z', subscription_line=line)
+            for line in lines
+        ])
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=user_type if i % 2 else group_type,
+                object_pk=str(user.pk if i % 2 else group.pk),
+                subscription_event=event
+            )
+            for i, user, group, event in zip(indexes, users, groups, events)
+        ])
+        self.rows = rows
+
+
+class ListQueriesTestCase(RelatedRowsMixin, TestCase):
+    sizes = (10, 100, 1000)
+    viewsets = (SubscriptionViewSet, SubscriptionLineViewSet, SubscriptionEventViewSet, ResourceViewSet)
+
+    def count_queries(self, viewset) -> int:
+        request = self.factory.get('/')
+        with CaptureQueriesContext(connection) as queries:
+            response = viewset.as_view({'get': 'list'})(request)
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_query_count_does_not_depend_on_rows(self):
+        counts = {viewset: [] for viewset in self.viewsets}
+        for rows in self.sizes:
+            self.populate(rows)
+            for viewset in self.viewsets:
+                counts[viewset].append(self.count_queries(viewset))
+
+        for viewset, values in counts.items():
+            with self.subTest(viewset=viewset.__name__):
+                self.assertEqual(len(set(values)), 1, values)
+
+    def test_display_name(self):
+        self.populate(1)
+        request = self.factory.get('/')
+        response = ResourceViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual(response.data['results'][0]['display_name'], str(Resource.objects.get()))
+
+
+class ListPaginationTestCase(RelatedRowsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.populate(250)
+
+    def list(self, viewset, data=None, url='/'):
+        request = self.factory.get(url, data)
+        response = viewset.as_view({'get': 'list'})(request)
+        response.render()
+        return response
+
+    def test_cursor_pagination(self):
+        response = self.list(ResourceViewSet)
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertIsNone(response.data['previous'])
+
+        pks = [item['id'] for item in response.data['results']]
+        while response.data['next']:
+            response = self.list(ResourceViewSet, url=response.data['next'])
+            pks += [item['id'] for item in response.data['results']]
+        self.assertListEqual(pks, sorted(Resource.objects.values_list('pk', flat=True)))
+
+    def test_page_size(self):
+        response = self.list(ResourceViewSet, {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_events_are_ordered_by_start(self):
+        SubscriptionEvent.objects.filter(pk=1).update(start='2019-01-01T12:00:00Z')
+        response = self.list(SubscriptionEventViewSet)
+        self.assertEqual(response.data['results'][0]['id'], 1)
+
+    def test_page_query_count_does_not_depend_on_depth(self):
+        response = self.list(ResourceViewSet)
+        with CaptureQueriesContext(connection) as first:
+            self.list(ResourceViewSet)
+        with CaptureQueriesContext(connection) as second:
+            self.list(ResourceViewSet, url=response.data['next'])
+        self.assertEqual(len(first), len(second))
+
+    def test_stream_ndjson(self):
+        request = self.factory.get('/', {'format': 'ndjson'})
+        response = ResourceViewSet.as_view({'get': 'list'})(request)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        items = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(items), 250)
+        self.assertListEqual(
+            [item['id'] for item in items],
+            sorted(Resource.objects.values_list('pk', flat=True))
+        )
+        self.assertEqual(items[0]['display_name'], str(Resource.objects.order_by('pk').first()))
+
+    def test_stream_reads_chunks(self):
+        request = self.factory.get('/', HTTP_ACCEPT='application/x-ndjson')
+        view = ResourceViewSet.as_view({'get': 'list'}, chunk_size=50)
+        with CaptureQueriesContext(connection) as queries:
+            lines = b''.join(view(request).streaming_content).splitlines()
+        self.assertEqual(len(lines), 250)
+        resource_queries = [
+            query for query in queries
+            if query['sql'].startswith('SELECT') and 'FROM "subscription_resource"' in query['sql']
+        ]
+        self.assertEqual(len(resource_queries), 1)
+        group_queries = [query for query in queries if 'FROM "auth_group"' in query['sql']]
+        self.assertEqual(len(group_queries), 5)
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from subscription.callbacks import CallbackRegistry
+from subscription.models import Resource
+from subscription.signals import callback_receiver
+from .utils import DUMMY_DOTTED_PATH, dummy
+
+
+class CallbackRegistryTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = CallbackRegistry(maxsize=2)
+
+    def test_resolve(self):
+        self.assertIs(self.registry.resolve(DUMMY_DOTTED_PATH), dummy)
+
+    @mock.patch('subscription.callbacks.import_string', return_value=dummy)
+    def test_resolve_once(self, mock_import):
+        self.registry.resolve(DUMMY_DOTTED_PATH)
+        self.registry.resolve(DUMMY_DOTTED_PATH)
+        mock_import.assert_called_once_with(DUMMY_DOTTED_PATH)
+        self.assertEqual((self.registry.hits, self.registry.misses), (1, 1))
+
+    def test_failures(self):
+        path = f'x.{DUMMY_DOTTED_PATH}'
+        for _ in range(2):
+            self.assertRaises(ImportError, self.registry.resolve, path)
+        self.assertEqual(self.registry.failures[path], 2)
+        self.assertEqual(self.registry.misses, 2)
+        self.assertNotIn(path, self.registry)
+
+    def test_failures_are_retried(self):
+        with mock.patch('subscription.callbacks.import_string', side_effect=ImportError):
+            self.assertRaises(ImportError, self.registry.resolve, DUMMY_DOTTED_PATH)
+        self.assertIs(self.registry.resolve(DUMMY_DOTTED_PATH), dummy)
+
+    def test_bounded(self):
+        paths = [DUMMY_DOTTED_PATH, 'subscription.tests.utils.split_path', 'os.path.join']
+        for path in paths:
+            self.registry.resolve(path)
+        self.assertEqual(len(self.registry), 2)
+        self.assertNotIn(paths[0], self.registry)
+
+    def test_invalidate(self):
+        self.registry.resolve(DUMMY_DOTTED_PATH)
+        self.registry.invalidate(DUMMY_DOTTED_PATH)
+        self.assertNotIn(DUMMY_DOTTED_PATH, self.registry)
+
+
+class ResourceHandlerTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    @mock.patch('subscription.signals.callback_registry.resolve')
+    def test_callback_without_path(self, mock_resolve):
+        callback_receiver(sender=Resource, instance=Resource.objects.get(id=2))
+        mock_resolve.assert_not_called()
@@ -0,0 +1,114 @@
+from unittest import mock
+import threading
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from subscription.callbacks import callback_registry
+from subscription.executors import CallbackExecutor
+from subscription.signals import dispatch_instances
+
+
+class CallbackExecutorTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.executor = CallbackExecutor(workers=2, timeout=5, queue_size=0)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_run(self):
+        self.assertListEqual(
+            self.executor.run([lambda: 1, lambda: 2, lambda: 3]),
+            [1, 2, 3]
+        )
+        stats = self.executor.stats()
+        self.assertEqual(stats['submitted'], 3)
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['queued'], 0)
+
+    def test_run_concurrently(self):
+        barrier = threading.Barrier(2, timeout=5)
+        results = self.executor.run([barrier.wait, barrier.wait])
+        self.assertSetEqual(set(results), {0, 1})
+
+    def test_timeout(self):
+        event = threading.Event()
+        self.addCleanup(event.set)
+        self.executor.timeout = 0.05
+
+        self.assertListEqual(self.executor.run([event.wait, lambda: 1]), [None, 1])
+        self.assertEqual(self.executor.timeouts, 1)
+
+    def test_saturated_pool_runs_inline(self):
+        event = threading.Event()
+        self.addCleanup(event.set)
+        self.executor.timeout = 0.05
+        caller = threading.current_thread()
+
+        threads = self.executor.run([
+            event.wait,
+            event.wait,
+            lambda: threading.current_thread()
+        ])
+        self.assertIs(threads[2], caller)
+        self.assertEqual(self.executor.inline, 1)
+
+    def test_errors_are_raised(self):
+        def fail():
+            raise ValueError
+
+        self.assertRaises(ValueError, self.executor.run, [fail, lambda: 1])
+        self.assertEqual(self.executor.failed, 1)
+        self.assertEqual(self.executor.completed, 1)
+
+    def test_disabled(self):
+        self.assertFalse(CallbackExecutor(workers=0).enabled)
+
+
+class ExecutorDispatchTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        self.executor = CallbackExecutor(workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def record_threads(self, mock_dummy):
+        threads = []
+        mock_dummy.side_effect = lambda **kwargs: threads.append(threading.current_thread().name)
+        return threads
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_callbacks_run_in_pool(self, mock_dummy):
+        threads = self.record_threads(mock_dummy)
+
+        with mock.patch('subscription.signals.callback_executor', self.executor):
+            self.assertEqual(dispatch_instances(User, {'1': self.user}, pooled=True, created=False), 1)
+
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('subscription-callback'))
+        self.assertEqual(self.executor.completed, 1)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_sync_dispatch_runs_inline(self, mock_dummy):
+        threads = self.record_threads(mock_dummy)
+
+        with mock.patch('subscription.signals.callback_executor', self.executor):
+            self.user.save()
+
+        self.assertListEqual(threads, [threading.current_thread().name])
+        self.assertEqual(self.executor.submitted, 0)
+
+    @override_settings(SUBSCRIPTION_DISPATCH='commit')
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_commit_dispatch_runs_in_pool(self, mock_dummy):
+        threads = self.record_threads(mock_dummy)
+
+        with mock.patch('subscription.signals.callback_executor', self.executor):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('subscription-callback'))
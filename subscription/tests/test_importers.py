@@ -0,0 +1,177 @@
+from io import StringIO
+from unittest import mock
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from subscription.api import ResourceViewSet
+from subscription.importers import BulkImporter, CSV
+from subscription.models import Resource, Subscription, SubscriptionEvent
+from subscription.routing import resource_index
+from subscription.wiring import signal_wiring
+
+
+def ndjson(*rows):
+    return StringIO('\n'.join(
+        row if isinstance(row, str) else json.dumps(row) for row in rows
+    ))
+
+
+class BulkImporterTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.users = User.objects.bulk_create([
+            User(username=f'import-{i}') for i in range(20)
+        ])
+
+    def resources(self, users, event=1):
+        rows = ['content_type,object_pk,subscription_event,callback,active']
+        rows += [f'auth.user,{user.pk},{event},,true' for user in users]
+        return StringIO('\n'.join(rows))
+
+    def test_import_subscriptions(self):
+        result = BulkImporter(Subscription).run(ndjson(
+            {'name': 'first', 'content_type': 'auth.user', 'object_pk': '1'},
+            {'name': 'second', 'content_type': 4, 'object_pk': '1', 'active': False},
+        ))
+        self.assertEqual(result.created, 2)
+        self.assertFalse(Subscription.objects.get(name='second').active)
+
+    def test_row_errors(self):
+        result = BulkImporter(SubscriptionEvent).run(ndjson(
+            {'start': '2020-02-01T12:00:00Z', 'subscription_line': 1},
+            'not json',
+            {'start': '2020-02-01T12:00:00Z', 'subscription_line': 100},
+            {'start': '2019-01-01T12:00:00Z', 'subscription_line': 1},
+            {'start': '2020-02-01T12:00:00Z', 'unknown': 1},
+            {'start': 'tomorrow', 'subscription_line': 1},
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertListEqual([error.line for error in result.errors], [2, 3, 4, 5, 6])
+        self.assertIn('subscription_line', result.errors[1].errors)
+        self.assertIn(NON_FIELD_ERRORS, result.errors[2].errors)
+        self.assertIn('start', result.errors[4].errors)
+
+    def test_events_get_next_occurrence(self):
+        BulkImporter(SubscriptionEvent).run(ndjson(
+            {'start': '2020-01-01T13:00:00Z', 'end': '2020-01-01T14:00:00Z',
+             'recurrence': '2 00:00:00', 'subscription_line': 1},
+        ))
+        event = SubscriptionEvent.objects.get(start='2020-01-01T13:00:00Z')
+        self.assertIsNotNone(event.next_start)
+
+    def test_naive_dates(self):
+        result = BulkImporter(SubscriptionEvent).run(ndjson(
+            {'start': '2020-03-01 12:00:00', 'end': '2020-03-01 13:00:00', 'subscription_line': 1},
+            {'start': 'not a date', 'end': None, 'subscription_line': 1},
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertListEqual([error.line for error in result.errors], [2])
+        self.assertIn('start', result.errors[0].errors)
+
+        event = SubscriptionEvent.objects.get(start__date='2020-03-01')
+        self.assertTrue(timezone.is_aware(event.start))
+
+    @override_settings(SUBSCRIPTION_PREVENT_OVERLAP=True)
+    def test_overlapping_rows(self):
+        result = BulkImporter(SubscriptionEvent).run(ndjson(
+            {'start': '2020-01-02T12:10:00Z', 'end': '2020-01-02T12:20:00Z', 'subscription_line': 3},
+            {'start': '2020-01-02T12:15:00Z', 'end': '2020-01-02T12:30:00Z', 'subscription_line': 3},
+            {'start': '2020-01-02T12:30:00Z', 'end': '2020-01-02T12:40:00Z', 'subscription_line': 3},
+        ))
+        self.assertEqual(result.created, 2)
+        self.assertListEqual([error.line for error in result.errors], [2])
+
+    @override_settings(SUBSCRIPTION_PREVENT_OVERLAP=True)
+    def test_rejected_rows_are_not_indexed(self):
+        importer = BulkImporter(SubscriptionEvent)
+        row = {'start': '2020-01-02T12:10:00Z', 'end': '2020-01-02T12:20:00Z', 'subscription_line': 3}
+        with mock.patch.object(SubscriptionEvent._default_manager, 'bulk_create', side_effect=IntegrityError):
+            result = importer.run(ndjson(row))
+        self.assertEqual(result.failed, 1)
+
+        result = importer.run(ndjson(row))
+        self.assertEqual(result.created, 1)
+
+    def test_import_resources(self):
+        result = BulkImporter(Resource).run(self.resources(self.users), CSV)
+        self.assertEqual(result.created, 20)
+        resource = Resource.objects.get(object_pk=str(self.users[0].pk))
+        self.assertEqual(resource.content_object_fields['username'], 'import-0')
+        self.assertIsNone(resource.callback)
+
+    def test_missing_related_object(self):
+        result = BulkImporter(Resource).run(ndjson(
+            {'content_type': 'auth.user', 'object_pk': '1000', 'subscription_event': 1},
+            {'content_type': 'auth.nothing', 'object_pk': '1', 'subscription_event': 1},
+        ))
+        self.assertEqual(result.created, 0)
+        self.assertEqual(result.failed, 2)
+
+    def test_import_refreshes_routing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resource_index.invalidate()
+        signal_wiring.setup()
+        self.addCleanup(signal_wiring.reset)
+        signal_wiring.disconnect(User)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BulkImporter(Resource).run(self.resources(self.users[:1]), CSV)
+        self.assertTrue(signal_wiring.watches(User))
+        self.assertTrue(resource_index.lookup(4, self.users[0].pk))
+
+    def test_query_count_does_not_depend_on_rows(self):
+        counts = []
+        for users in (self.users[:5], self.users[5:]):
+            with CaptureQueriesContext(connection) as queries:
+                BulkImporter(Resource).run(self.resources(users), CSV)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = BulkImporter(Resource, batch_size=5).run(self.resources(self.users), CSV)
+        self.assertEqual(result.created, 20)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 4)
+
+    def test_integrity_errors(self):
+        result = BulkImporter(SubscriptionEvent).run(ndjson(
+            {'start': '2020-01-01T12:00:00Z', 'end': None, 'subscription_line': 1},
+            {'start': '2020-03-01T12:00:00Z', 'end': '2020-03-02T12:00:00Z', 'subscription_line': 1},
+            {'start': '2020-03-01T12:00:00Z', 'end': '2020-03-02T12:00:00Z', 'subscription_line': 1},
+        ))
+        self.assertEqual(result.created, 2)
+        self.assertListEqual([error.line for error in result.errors], [3])
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.resources(self.users).getvalue())
+        self.addCleanup(os.unlink, f.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_subscriptions', 'resource', f.name, stdout=out, stderr=err)
+        self.assertIn('Created: 20, failed: 0', out.getvalue())
+
+    def test_api(self):
+        view = ResourceViewSet.as_view({'post': 'bulk_import'})
+        request = APIRequestFactory().post(
+            '/resources/import/',
+            self.resources(self.users[:3]).getvalue() + '\nauth.user,1000,1,,true',
+            content_type='text/csv'
+        )
+        response = view(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['errors'][0]['line'], 5)
@@ -0,0 +1,130 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from subscription.intervals import IntervalIndex, LineIntervals
+from subscription.models import SubscriptionEvent, SubscriptionLine
+
+
+class IntervalIndexTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.date = timezone.now().replace(microsecond=0)
+        self.index = IntervalIndex([
+            (self.hours(0), self.hours(2), 1),
+            (self.hours(3), self.hours(4), 2),
+            (self.hours(10), None, 3),
+        ])
+
+    def hours(self, hours):
+        return self.date + timezone.timedelta(hours=hours)
+
+    def keys(self, start, end=None):
+        return [interval.key for interval in self.index.overlapping(start, end)]
+
+    def test_overlapping(self):
+        self.assertListEqual(self.keys(self.hours(1), self.hours(3.5)), [1, 2])
+        self.assertListEqual(self.keys(self.hours(5), self.hours(11)), [3])
+        self.assertListEqual(self.keys(self.hours(20)), [3])
+        self.assertListEqual(self.keys(self.hours(-1)), [1, 2, 3])
+
+    def test_adjacent_intervals_do_not_overlap(self):
+        self.assertListEqual(self.keys(self.hours(2), self.hours(3)), [])
+        self.assertListEqual(self.keys(self.hours(4), self.hours(10)), [])
+
+    def test_long_interval(self):
+        self.index.add(self.hours(-100), self.hours(100), 4)
+        self.assertListEqual(self.keys(self.hours(50), self.hours(51)), [4, 3])
+
+    def test_remove(self):
+        self.assertTrue(self.index.remove(self.hours(3), self.hours(4), 2))
+        self.assertFalse(self.index.remove(self.hours(0), self.hours(2), 4))
+        self.assertTrue(self.index.remove(self.hours(10), None, 3))
+        self.assertListEqual(self.keys(self.hours(-1)), [1])
+
+    def test_validate_no_overlap(self):
+        self.index.validate_no_overlap(self.hours(2), self.hours(3))
+        with self.assertRaises(ValidationError):
+            self.index.validate_no_overlap(self.hours(1), self.hours(3))
+
+
+class LineIntervalsTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.event = SubscriptionEvent.objects.get(id=3)
+        self.line = SubscriptionLine.objects.get(id=3)
+
+    def build(self, start, end, recurrence=None):
+        return SubscriptionEvent(
+            start=self.event.start + start,
+            end=self.event.start + end,
+            recurrence=recurrence,
+            subscription_line=self.line,
+        )
+
+    def test_index_is_loaded_with_a_query(self):
+        with self.assertNumQueries(1):
+            intervals = LineIntervals(self.line)
+        self.assertEqual(len(intervals.index), 3)
+
+    def test_event_between_occurrences(self):
+        event = self.build(timezone.timedelta(hours=24, minutes=30), timezone.timedelta(hours=25))
+        LineIntervals(self.line).validate_no_overlap(event)
+
+    def test_event_overlapping_an_occurrence(self):
+        event = self.build(timezone.timedelta(hours=24, minutes=30), timezone.timedelta(hours=26))
+        with self.assertRaises(ValidationError):
+            LineIntervals(self.line).validate_no_overlap(event)
+
+    def test_recurring_event_overlapping_a_later_occurrence(self):
+        event = self.build(
+            timezone.timedelta(hours=24, minutes=15),
+            timezone.timedelta(hours=24, minutes=45),
+            timezone.timedelta(hours=24, minutes=30),
+        )
+        with self.assertRaises(ValidationError):
+            LineIntervals(self.line).validate_no_overlap(event)
+
+    def test_bulk_validation(self):
+        intervals = LineIntervals(self.line)
+        first = self.build(timezone.timedelta(hours=24, minutes=10), timezone.timedelta(hours=24, minutes=40))
+        second = self.build(timezone.timedelta(hours=24, minutes=30), timezone.timedelta(hours=25))
+        with self.assertNumQueries(0):
+            intervals.validate_no_overlap(first, add=True)
+            with self.assertRaises(ValidationError):
+                intervals.validate_no_overlap(second)
+
+    def test_discard(self):
+        intervals = LineIntervals(self.line)
+        event = self.build(timezone.timedelta(hours=24, minutes=10), timezone.timedelta(hours=24, minutes=40))
+        intervals.validate_no_overlap(event, add=True)
+        intervals.discard(event)
+        self.assertEqual(len(intervals.index), 3)
+        intervals.validate_no_overlap(event)
+
+    def test_excluded_event(self):
+        LineIntervals(self.line, exclude=[self.event.pk]).validate_no_overlap(self.event)
+
+    @override_settings(SUBSCRIPTION_PREVENT_OVERLAP=True)
+    def test_full_clean(self):
+        self.event.full_clean()
+        with self.assertRaises(ValidationError):
+            self.build(timezone.timedelta(hours=1), timezone.timedelta(hours=2)).full_clean()
+
+    @override_settings(SUBSCRIPTION_PREVENT_OVERLAP=True)
+    def test_clean_does_not_check_overlap(self):
+        self.build(timezone.timedelta(hours=1), timezone.timedelta(hours=2)).clean()
+
+    def test_full_clean_is_disabled_by_default(self):
+        self.build(timezone.timedelta(hours=1), timezone.timedelta(hours=2)).full_clean()
+
+    @override_settings(SUBSCRIPTION_PREVENT_OVERLAP=True)
+    def test_occurrences_are_not_checked(self):
+        event = SubscriptionEvent.objects.select_related('subscription_line').get(id=1)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(event.current)
+        event.save()
+        event.refresh_from_db()
+        self.assertEqual(event.next_start, event.start)
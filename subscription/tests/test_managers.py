@@ -1,7 +1,21 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
+from subscription.callbacks import callback_registry
 from subscription.managers import (
-    SubscriptionManager, SubscriptionEventManager, SubscriptionLineManager, ResourceManager
+    SubscriptionManager, SubscriptionEventManager, SubscriptionLineManager, ResourceManager,
+    NotifyChangesQuerySet
+)
+from subscription.routing import resource_index
+from subscription.wiring import signal_wiring
+from subscription.models import (
+    Resource, SubscriptionEvent, SubscriptionLine, DailySubscriptionEvent, MonthlySubscriptionEvent
 )
 
 
@@ -10,7 +24,165 @@ class SubscriptionManagerTestCase(TestCase):
 
 
 class SubscriptionEventManagerTestCase(TestCase):
-    pass
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.event = SubscriptionEvent.objects.get(id=3)
+
+    def occurring(self, date, model_class=SubscriptionEvent):
+        return list(
+            model_class.objects.all().occurring(date).values_list('pk', flat=True)
+        )
+
+    def test_occurring_one_time_event(self):
+        self.assertListEqual(self.occurring(timezone.now()), [1])
+
+    def test_occurring_recurring_event(self):
+        date = self.event.start + timezone.timedelta(hours=26)
+        self.assertListEqual(self.occurring(date), [1, 2, 3])
+
+    def test_occurring_between_occurrences(self):
+        date = self.event.end + timezone.timedelta(minutes=30)
+        self.assertListEqual(self.occurring(date), [1, 2])
+
+    def test_occurring_after_line_end(self):
+        date = self.event.subscription_line.end
+        self.assertListEqual(self.occurring(date), [1, 2])
+
+    def expand(self, model_class, start, end):
+        occurrences = []
+        for event in model_class.objects.select_related('subscription_line').order_by('pk'):
+            index = event.occurrence_index(start)
+            while True:
+                occurrence = event.occurrence(index)
+                try:
+                    occurrence.clean()
+                except ValidationError:
+                    break
+                if occurrence.start >= end:
+                    break
+                if occurrence.end is None or occurrence.end > start:
+                    occurrences.append((event.pk, occurrence.start, occurrence.end))
+                if not (event.end and event._recurrence):
+                    break
+                index += 1
+        return occurrences
+
+    def test_occurrences(self):
+        start = self.event.start + timezone.timedelta(hours=30)
+        occurrences = SubscriptionEvent.objects.occurrences(
+            start, start + timezone.timedelta(days=3)
+        )
+        self.assertEqual(
+            [(pk, start, end) for pk, start, end in occurrences.rows() if pk == 3],
+            [
+                (3, self.event.start + self.event.recurrence, self.event.end + self.event.recurrence),
+                (3, self.event.start + self.event.recurrence * 2, self.event.subscription_line.end),
+            ]
+        )
+
+    def test_occurrences_match_instances(self):
+        for model_class in (SubscriptionEvent, DailySubscriptionEvent, MonthlySubscriptionEvent):
+            for hours in (-24, 0, 13, 30, 24 * 9, 24 * 40):
+                start = self.event.start + timezone.timedelta(hours=hours)
+                for days in (1, 5, 90):
+                    end = start + timezone.timedelta(days=days)
+                    with self.subTest(model=model_class.__name__, start=start, end=end):
+                        self.assertListEqual(
+                            list(model_class.objects.occurrences(start, end).rows()),
+                            self.expand(model_class, start, end)
+                        )
+
+    def test_occurrences_query_count(self):
+        start = self.event.start
+        with self.assertNumQueries(1):
+            SubscriptionEvent.objects.occurrences(start, start + timezone.timedelta(days=365))
+
+    def test_occurring_calendar_based_events(self):
+        date = self.event.end + timezone.timedelta(minutes=30)
+        self.assertListEqual(self.occurring(date, DailySubscriptionEvent), [1, 2, 3])
+
+        date = self.event.subscription_line.end
+        self.assertListEqual(self.occurring(date, DailySubscriptionEvent), [1, 2])
+
+    @mock.patch('django.utils.timezone.now')
+    def test_occurring_matches_current(self, mock_now):
+        for hours in range(-1, 24 * 12):
+            mock_now.return_value = self.event.start + timezone.timedelta(hours=hours)
+            self.assertListEqual(
+                self.occurring(None),
+                [event.pk for event in SubscriptionEvent.objects.all() if event.current]
+            )
+
+    def test_advance_stale_events(self):
+        date = self.event.start + timezone.timedelta(hours=26)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(date, batch_size=2), 3)
+
+        event = SubscriptionEvent.objects.get(id=3)
+        self.assertEqual(event.next_start, self.event.start + timezone.timedelta(hours=25))
+        self.assertEqual(event.next_end, self.event.end + timezone.timedelta(hours=25))
+
+    def test_advance_only_stale_events(self):
+        date = self.event.start + timezone.timedelta(hours=26)
+        SubscriptionEvent.objects.all().advance(date)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(date), 0)
+
+        date = self.event.end + timezone.timedelta(hours=25)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(date), 2)
+
+    def test_advance_finished_events(self):
+        date = self.event.subscription_line.end
+        SubscriptionEvent.objects.all().advance(date)
+
+        event = SubscriptionEvent.objects.get(id=3)
+        self.assertIsNone(event.next_start)
+        self.assertIsNone(event.next_end)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(date), 0)
+
+    def test_advance_exhausted_events(self):
+        # The fourth occurrence would start after the end of the line,
+        # which has not ended yet.
+        SubscriptionEvent.objects.filter(id=3).update(
+            end=self.event.start + timezone.timedelta(hours=1),
+            recurrence=timezone.timedelta(hours=24)
+        )
+        SubscriptionLine.objects.filter(id=3).update(
+            end=self.event.start + timezone.timedelta(days=2, hours=23)
+        )
+        date = self.event.start + timezone.timedelta(days=2, hours=2)
+        SubscriptionEvent.objects.all().advance(date)
+
+        event = SubscriptionEvent.objects.get(id=3)
+        self.assertIsNone(event.next_start)
+        self.assertTrue(event.exhausted)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(date), 0)
+
+    def test_extended_line_recomputes_exhausted_events(self):
+        line = SubscriptionLine.objects.get(id=1)
+        event = SubscriptionEvent.objects.create(
+            start=timezone.now() - timezone.timedelta(hours=2),
+            end=timezone.now() - timezone.timedelta(hours=1),
+            recurrence=timezone.timedelta(hours=3),
+            subscription_line=line,
+        )
+        line.end = timezone.now() + timezone.timedelta(minutes=30)
+        line.save()
+        event.refresh_from_db()
+        self.assertTrue(event.exhausted)
+
+        line.end = timezone.now() + timezone.timedelta(days=1)
+        line.save()
+        event.refresh_from_db()
+        self.assertFalse(event.exhausted)
+        self.assertEqual(event.next_start, event.start + event.recurrence)
+        self.assertEqual(SubscriptionEvent.objects.all().advance(), 0)
+
+    def test_current_line_events(self):
+        date = self.event.start + timezone.timedelta(hours=26)
+        with mock.patch('django.utils.timezone.now', return_value=date):
+            events = SubscriptionEvent.objects.all().current(self.event.subscription_line_id)
+            self.assertListEqual(list(events), [self.event])
 
 
 class SubscriptionLineManagerTestCase(TestCase):
@@ -18,4 +190,140 @@ class SubscriptionLineManagerTestCase(TestCase):
 
 
 class ResourceManagerTestCase(TestCase):
-    pass
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def test_ready_resources(self):
+        with self.assertNumQueries(1):
+            resources = list(Resource.objects.all().ready())
+        self.assertListEqual(
+            sorted(resource.pk for resource in resources),
+            [1, 2]
+        )
+
+    def test_ready_excludes_inactive_resources(self):
+        Resource.objects.filter(id=1).update(active=False)
+        resources = Resource.objects.all().ready()
+        self.assertListEqual([resource.pk for resource in resources], [2])
+
+    def test_ready_excludes_future_events(self):
+        SubscriptionEvent.objects.filter(id=1).update(
+            start=timezone.now() + timezone.timedelta(days=1)
+        )
+        self.assertFalse(Resource.objects.all().ready().exists())
+
+    @mock.patch('django.utils.timezone.now')
+    def test_ready_excludes_events_between_occurrences(self, mock_now):
+        event = SubscriptionEvent.objects.get(id=3)
+        Resource.objects.update(subscription_event=event)
+        mock_now.return_value = event.end + timezone.timedelta(minutes=30)
+        self.assertFalse(Resource.objects.all().ready().exists())
+
+    def test_ready_matches_is_ready(self):
+        user = User.objects.get(id=1)
+        resource = Resource.objects.get(id=1)
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=resource.content_type,
+                object_pk=resource.object_pk,
+                subscription_event_id=event_id,
+                active=active
+            )
+            for event_id in (1, 2, 3)
+            for active in (True, False)
+        ])
+        queryset = Resource.objects.all().related_objects(user)
+        self.assertListEqual(
+            sorted(resource.pk for resource in queryset.ready()),
+            sorted(resource.pk for resource in queryset if resource.is_ready)
+        )
+
+
+class NotifyChangesTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.resource = Resource.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        signal_wiring.setup()
+        signal_wiring.connect(User)
+        self.addCleanup(signal_wiring.reset)
+
+    def create_users(self, count: int):
+        users = User.objects.bulk_create([
+            User(username=f'bulk-{i}') for i in range(count)
+        ])
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=self.resource.content_type,
+                object_pk=str(user.pk),
+                subscription_event_id=self.resource.subscription_event_id,
+                callback=self.resource.callback
+            )
+            for user in users
+        ])
+        resource_index.invalidate()
+        return [user.pk for user in users]
+
+    def count_resource_selects(self, pks) -> int:
+        with CaptureQueriesContext(connection) as context:
+            Resource.objects.notify_changed(User, pks)
+        return len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "subscription_resource"' in query['sql']
+        ])
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_notify_changed(self, mock_dummy):
+        pks = self.create_users(5)
+        self.assertEqual(Resource.objects.notify_changed(User, pks), 5)
+        self.assertEqual(mock_dummy.call_count, 5)
+        self.assertSetEqual(
+            {call.kwargs['instance'].object_pk for call in mock_dummy.call_args_list},
+            set(pks)
+        )
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_resource_selects_do_not_depend_on_objects(self, _):
+        pks = self.create_users(10)
+        self.count_resource_selects(pks)
+        self.assertEqual(self.count_resource_selects(pks[:2]), self.count_resource_selects(pks))
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_unwatched_objects_are_skipped(self, mock_dummy):
+        user = User.objects.create(username='unwatched')
+        self.assertEqual(Resource.objects.notify_changed(User, [user.pk]), 0)
+        mock_dummy.assert_not_called()
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_update_notifies_changed_objects(self, mock_dummy):
+        pks = self.create_users(3)
+        NotifyChangesQuerySet(User).filter(pk__in=pks).update(first_name='bulk')
+
+        self.assertEqual(mock_dummy.call_count, 3)
+        for resource in Resource.objects.filter(object_pk__in=[str(pk) for pk in pks]):
+            self.assertEqual(resource.get_stored_values()['first_name'], 'bulk')
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_update_without_request(self, mock_dummy):
+        pks = self.create_users(2)
+        signal_wiring.reset()
+        NotifyChangesQuerySet(User).filter(pk__in=pks).update(first_name='bulk')
+
+        self.assertTrue(signal_wiring.loaded)
+        self.assertEqual(mock_dummy.call_count, 2)
+
+    @mock.patch('subscription.managers.notify_objects')
+    def test_bulk_create_notifies_created_objects(self, mock_notify):
+        users = NotifyChangesQuerySet(User).bulk_create([User(username='created')])
+        mock_notify.assert_called_once_with(
+            User, [users[0].pk], created=True, using='default'
+        )
+
+    @mock.patch('subscription.managers.notify_objects')
+    def test_unwatched_models_are_not_notified(self, mock_notify):
+        signal_wiring.disconnect(User)
+        NotifyChangesQuerySet(User).update(first_name='bulk')
+        mock_notify.assert_not_called()
@@ -1,12 +1,15 @@
-from typing import Callable
+from unittest import mock
 
-from django.db.models.signals import ModelSignal
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.db import DatabaseError
+from django.db.models.signals import post_migrate, post_save
 from django.test import TestCase
 from django.contrib.auth.models import User
 
 from subscription.middleware import SubscriberMiddleware
 from subscription.models import Resource
 from subscription.models.decorators import DEFAULT_SIGNAL, DEFAULT_RECEIVER
+from subscription.wiring import SignalWiring, signal_wiring
 
 
 class SubscriberMiddlewareTestCase(TestCase):
@@ -14,24 +17,28 @@ class SubscriberMiddlewareTestCase(TestCase):
 
     def setUp(self):
         super().setUp()
-        self.signal: ModelSignal = DEFAULT_SIGNAL
-        self.recv: Callable = DEFAULT_RECEIVER
         self.user = User.objects.create(username='test')
+        signal_wiring.reset()
+        self.addCleanup(signal_wiring.reset)
+
+    def handle_request(self):
+        middleware = SubscriberMiddleware(lambda request: request)
+        return middleware(None)
 
     def test_empty_resources(self):
         resources = Resource.objects.all()
         resources.delete()
 
-        _ = SubscriberMiddleware(lambda x: x)
-        response = self.signal.disconnect(self.recv, sender=self.user.__class__)
+        self.handle_request()
+        response = signal_wiring.disconnect(self.user.__class__)
         self.assertFalse(response)
 
     def test_related_class_connected(self):
-        _ = SubscriberMiddleware(lambda x: x)
+        self.handle_request()
 
         resource = Resource.objects.first()
         model_class = resource.content_type.model_class()
-        response = self.signal.disconnect(self.recv, sender=model_class)
+        response = signal_wiring.disconnect(model_class)
 
         self.assertTrue(response)
 
@@ -41,16 +48,141 @@ class SubscriberMiddlewareTestCase(TestCase):
         resources = Resource.objects.filter(content_type=resource.content_type)
         resources.delete()
 
-        _ = SubscriberMiddleware(lambda x: x)
-        response = self.signal.disconnect(self.recv, sender=model_class)
+        self.handle_request()
+        response = signal_wiring.disconnect(model_class)
         self.assertFalse(response)
 
     def test_all_related_class_connected(self):
-        _ = SubscriberMiddleware(lambda x: x)
+        self.handle_request()
 
         for model_class in Resource.objects.related_models():
-            response = self.signal.disconnect(self.recv, sender=model_class)
+            response = signal_wiring.disconnect(model_class)
             self.assertTrue(response)
         else:
-            response = self.signal.disconnect(self.recv, sender=model_class)
+            response = signal_wiring.disconnect(model_class)
             self.assertFalse(response)
+
+    def test_models_are_loaded_on_first_request(self):
+        with self.assertNumQueries(0):
+            middleware = SubscriberMiddleware(lambda request: request)
+        # The related models query, in a savepoint.
+        with self.assertNumQueries(3):
+            middleware(None)
+        with self.assertNumQueries(0):
+            middleware(None)
+
+        self.assertSetEqual(signal_wiring.connected, set(Resource.objects.related_models()))
+        self.assertIsNotNone(signal_wiring.duration)
+
+    def test_deactivated_resources_are_disconnected(self):
+        self.handle_request()
+        resource = Resource.objects.get(id=1)
+        model_class = resource.content_type.model_class()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resource.active = False
+            resource.save()
+
+        self.assertNotIn(model_class, signal_wiring.connected)
+        self.assertFalse(signal_wiring.disconnect(model_class))
+
+    def test_activated_resources_are_connected(self):
+        resource = Resource.objects.get(id=1)
+        resource.active = False
+        resource.save()
+        self.handle_request()
+        model_class = resource.content_type.model_class()
+        self.assertNotIn(model_class, signal_wiring.connected)
+
+        resource.active = True
+        resource.save()
+
+        self.assertIn(model_class, signal_wiring.connected)
+
+    def test_deactivation_is_not_applied_before_commit(self):
+        self.handle_request()
+        resource = Resource.objects.get(id=1)
+        resource.active = False
+        resource.save()
+
+        self.assertIn(resource.content_type.model_class(), signal_wiring.connected)
+
+    def test_async_requests(self):
+        async def get_response(request):
+            return request
+
+        middleware = SubscriberMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertIsNone(async_to_sync(middleware)(None))
+        self.assertTrue(signal_wiring.loaded)
+
+
+class SignalWiringTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.receiver = mock.Mock()
+        self.wiring = SignalWiring(receiver=self.receiver)
+        self.addCleanup(post_save.disconnect, dispatch_uid=self.wiring.dispatch_uid)
+        self.addCleanup(post_migrate.disconnect, dispatch_uid=self.wiring.dispatch_uid)
+
+    def test_watched_models_are_dispatched(self):
+        self.wiring.connect(User)
+        user = User.objects.create(username='test')
+
+        self.receiver.assert_called_once()
+        self.assertIs(self.receiver.call_args.kwargs['instance'], user)
+
+    def test_unwatched_models_are_not_dispatched(self):
+        Resource.objects.filter(content_type__model='user').delete()
+        User.objects.create(username='test')
+        self.wiring.connect(User)
+        self.wiring.disconnect(User)
+        User.objects.create(username='other')
+
+        self.receiver.assert_not_called()
+
+    def test_models_are_loaded_on_first_save(self):
+        self.assertFalse(self.wiring.loaded)
+        user = User.objects.create(username='test')
+
+        self.assertTrue(self.wiring.loaded)
+        self.assertTrue(self.wiring.watches(User))
+        self.assertIs(self.receiver.call_args.kwargs['instance'], user)
+
+    @mock.patch('subscription.wiring.SignalWiring.table_exists', return_value=False)
+    @mock.patch('subscription.managers.ResourceManager.related_models', side_effect=DatabaseError)
+    def test_setup_waits_for_migrations(self, related_models, table_exists):
+        with self.assertLogs('subscription.wiring', 'INFO') as logs:
+            User.objects.create(username='test')
+            User.objects.create(username='other')
+
+        related_models.assert_called_once()
+        self.assertEqual(len(logs.records), 1)
+        self.assertIsNone(logs.records[0].exc_info)
+        self.assertFalse(self.wiring.loaded)
+
+        related_models.side_effect = None
+        related_models.return_value = [User]
+        self.wiring.migrated()
+        User.objects.create(username='migrated')
+
+        self.assertTrue(self.wiring.loaded)
+        self.receiver.assert_called_once()
+
+    def test_raw_saves_are_not_dispatched(self):
+        self.wiring.connect(User)
+        User(username='test').save_base(raw=True)
+
+        self.assertFalse(self.wiring.loaded)
+        self.receiver.assert_not_called()
+
+    def test_watching_does_not_connect_receivers(self):
+        receivers = len(post_save.receivers)
+        self.wiring.connect(User)
+        self.assertEqual(len(post_save.receivers), receivers)
+
+    def test_default_receiver_is_dispatched(self):
+        self.assertTrue(signal_wiring.handles(DEFAULT_SIGNAL, DEFAULT_RECEIVER))
+        self.assertFalse(self.wiring.handles(DEFAULT_SIGNAL, DEFAULT_RECEIVER))
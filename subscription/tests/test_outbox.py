@@ -0,0 +1,98 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from subscription.callbacks import callback_registry
+from subscription.models import Resource, ResourceDispatch
+from subscription.outbox import drain
+from subscription.wiring import signal_wiring
+
+
+@override_settings(SUBSCRIPTION_DISPATCH='outbox')
+class OutboxTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        signal_wiring.connect(User)
+        self.addCleanup(signal_wiring.disconnect, User)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_save_writes_entries(self, mock_dummy):
+        self.user.save()
+        mock_dummy.assert_not_called()
+        self.assertListEqual(
+            list(ResourceDispatch.objects.values_list('resource_id', 'object_created')),
+            [(1, False)]
+        )
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_bulk_notification_writes_entries(self, _):
+        Resource.objects.notify_changed(User, [self.user.pk], created=True)
+        self.assertListEqual(
+            list(ResourceDispatch.objects.values_list('resource_id', 'object_created')),
+            [(1, True)]
+        )
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_drain(self, mock_dummy):
+        self.user.first_name = 'changed'
+        self.user.save()
+
+        self.assertEqual(drain(), 1)
+        mock_dummy.assert_called_once()
+        self.assertFalse(mock_dummy.call_args.kwargs['created'])
+        self.assertFalse(ResourceDispatch.objects.exists())
+        resource = Resource.objects.get(id=1)
+        self.assertEqual(resource.get_stored_values()['first_name'], 'changed')
+
+    @mock.patch('subscription.tests.utils.dummy', side_effect=ValueError('failed'))
+    def test_failed_entries_are_retried_later(self, mock_dummy):
+        self.user.save()
+
+        with self.assertLogs('subscription.outbox', 'WARNING'):
+            self.assertEqual(drain(), 0)
+        entry = ResourceDispatch.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn('ValueError: failed', entry.last_error)
+        self.assertGreater(entry.available_at, timezone.now())
+
+        self.assertEqual(drain(), 0)
+        mock_dummy.assert_called_once()
+
+    @override_settings(SUBSCRIPTION_OUTBOX_MAX_ATTEMPTS=1)
+    @mock.patch('subscription.tests.utils.dummy', side_effect=ValueError)
+    def test_failed_entries_are_given_up(self, _):
+        self.user.save()
+        with self.assertLogs('subscription.outbox', 'WARNING'):
+            drain()
+        self.assertIsNone(ResourceDispatch.objects.get().available_at)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_inactive_resources_are_dropped(self, mock_dummy):
+        self.user.save()
+        Resource.objects.filter(id=1).update(active=False)
+
+        self.assertEqual(drain(), 0)
+        mock_dummy.assert_not_called()
+        self.assertFalse(ResourceDispatch.objects.exists())
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_drain_in_batches(self, mock_dummy):
+        for _ in range(3):
+            self.user.save()
+
+        self.assertEqual(drain(batch_size=2, max_batches=1), 2)
+        self.assertEqual(ResourceDispatch.objects.count(), 1)
+
+        out = StringIO()
+        call_command('drain_dispatches', '--batch-size', '2', stdout=out)
+        self.assertIn('Delivered dispatches: 1', out.getvalue())
+        self.assertEqual(mock_dummy.call_count, 3)
@@ -0,0 +1,119 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+
+from subscription.callbacks import callback_registry
+from subscription.models import Resource, Subscription
+from subscription.routing import ResourceIndex, resource_index
+from subscription.signals import default_receiver
+
+
+class ResourceIndexTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        self.content_type = ContentType.objects.get_for_model(User)
+        with self.captureOnCommitCallbacks(execute=True):
+            resource_index.invalidate()
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+
+    def test_lookup(self):
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, self.user.pk), {1}
+        )
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, 2), set()
+        )
+
+    def test_lookup_is_cached(self):
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+        with self.assertNumQueries(0):
+            resource_index.lookup(self.content_type.pk, self.user.pk)
+
+    def test_unwatched_object_does_not_query(self):
+        user = User.objects.create(username='unwatched')
+        resource_index.lookup(self.content_type.pk, user.pk)
+        with self.assertNumQueries(0):
+            default_receiver(sender=User, instance=user, created=False)
+
+    def test_invalidate_on_resource_save(self):
+        resource = Resource.objects.get(id=1)
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+
+        resource.active = False
+        resource.save()
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, self.user.pk), set()
+        )
+
+    def test_invalidate_on_resource_delete(self):
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+        Resource.objects.get(id=1).delete()
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, self.user.pk), set()
+        )
+
+    def test_invalidate_on_subscription_save(self):
+        subscription = Subscription.objects.get(id=1)
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+
+        subscription.active = False
+        subscription.save()
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, self.user.pk), set()
+        )
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_dispatch_does_not_invalidate(self, _):
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+        with mock.patch.object(resource_index, 'invalidate') as invalidate:
+            default_receiver(sender=User, instance=self.user, created=False)
+        invalidate.assert_not_called()
+
+    def test_pending_index_is_not_kept(self):
+        Resource.objects.get(id=1).delete()
+        self.assertTrue(resource_index.pending())
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+        self.assertIsNone(resource_index._routes)
+
+    def test_pending_index_is_loaded_once(self):
+        Resource.objects.get(id=1).delete()
+        with self.assertNumQueries(1):
+            resource_index.lookup(self.content_type.pk, self.user.pk)
+            resource_index.lookup(self.content_type.pk, 2)
+
+        resource = Resource.objects.get(id=2)
+        resource.content_type = self.content_type
+        resource.object_pk = str(self.user.pk)
+        resource.save()
+        self.assertSetEqual(
+            resource_index.lookup(self.content_type.pk, self.user.pk), {2}
+        )
+
+    def test_invalidate_on_attname_update_fields(self):
+        resource = Resource.objects.get(id=1)
+        resource_index.lookup(self.content_type.pk, self.user.pk)
+
+        resource.subscription_event_id = 3
+        resource.save(update_fields=['subscription_event_id'])
+        self.assertTrue(resource_index.pending())
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }, SUBSCRIPTION_ROUTING_CACHE='default')
+    def test_invalidate_shared_index(self):
+        index = ResourceIndex()
+        other = ResourceIndex()
+        index.lookup(self.content_type.pk, self.user.pk)
+        other.lookup(self.content_type.pk, self.user.pk)
+
+        Resource.objects.filter(id=1).update(active=False)
+        index.invalidate()
+        self.assertSetEqual(
+            other.lookup(self.content_type.pk, self.user.pk), set()
+        )
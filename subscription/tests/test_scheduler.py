@@ -0,0 +1,175 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from subscription.callbacks import callback_registry
+from subscription.models import Resource, SubscriptionEvent
+from subscription.scheduler import OccurrenceScheduler, fire_due
+
+
+class SchedulerTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        Resource.objects.filter(id=1).update(subscription_event_id=3)
+        self.event = SubscriptionEvent.objects.get(id=3)
+
+    def fire(self, date) -> int:
+        SubscriptionEvent.objects.all().advance(date)
+        return fire_due(date)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fire_started_occurrence(self, mock_dummy):
+        date = self.event.start + timezone.timedelta(hours=1)
+        self.fire(date)
+
+        mock_dummy.assert_called_once()
+        self.assertEqual(
+            mock_dummy.call_args.kwargs['occurrence'],
+            (self.event.start, self.event.end)
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.fired_start, self.event.start)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fire_once_per_occurrence(self, mock_dummy):
+        date = self.event.start + timezone.timedelta(hours=1)
+        self.fire(date)
+        self.assertEqual(self.fire(date + timezone.timedelta(hours=1)), 0)
+        mock_dummy.assert_called_once()
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fire_next_occurrence(self, mock_dummy):
+        recurrence = self.event.recurrence
+        self.fire(self.event.start + timezone.timedelta(hours=1))
+        self.fire(self.event.end + timezone.timedelta(minutes=30))
+        self.assertEqual(mock_dummy.call_count, 1)
+
+        self.fire(self.event.start + recurrence + timezone.timedelta(hours=1))
+        self.assertEqual(mock_dummy.call_count, 2)
+        self.assertEqual(
+            mock_dummy.call_args.kwargs['occurrence'],
+            (self.event.start + recurrence, self.event.end + recurrence)
+        )
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_inactive_resources_are_not_fired(self, mock_dummy):
+        Resource.objects.filter(id=1).update(active=False)
+        self.assertEqual(self.fire(self.event.start + timezone.timedelta(hours=1)), 3)
+        mock_dummy.assert_not_called()
+
+    @mock.patch('subscription.tests.utils.dummy', side_effect=ValueError)
+    def test_failed_callbacks_are_logged(self, _):
+        with self.assertLogs('subscription.scheduler', 'ERROR'):
+            self.fire(self.event.start + timezone.timedelta(hours=1))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.fired_start, self.event.start)
+
+    def test_due_events(self):
+        date = self.event.start + timezone.timedelta(hours=1)
+        SubscriptionEvent.objects.all().advance(date)
+        self.assertListEqual(
+            sorted(SubscriptionEvent.objects.all().due(date).values_list('pk', flat=True)),
+            [1, 2, 3]
+        )
+        fire_due(date)
+        self.assertFalse(SubscriptionEvent.objects.all().due(date).exists())
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_command(self, _):
+        out = StringIO()
+        call_command('fire_events', stdout=out)
+        self.assertIn('Fired events: 1', out.getvalue())
+
+
+class OccurrenceSchedulerTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        Resource.objects.filter(id=1).update(subscription_event_id=3)
+        self.event = SubscriptionEvent.objects.get(id=3)
+        # Five minutes before the second occurrence of the event.
+        self.start = self.event.start + self.event.recurrence
+        self.now = self.start - timezone.timedelta(minutes=5)
+        self.scheduler = OccurrenceScheduler(
+            horizon=timezone.timedelta(minutes=10),
+            refill_interval=timezone.timedelta(minutes=1)
+        )
+
+    def test_refill(self):
+        self.scheduler.refill(self.now)
+        self.assertIn((self.start, 3, self.event.end + self.event.recurrence), self.scheduler._heap)
+        self.assertEqual(self.scheduler.loaded_until, self.now + timezone.timedelta(minutes=10))
+
+    def test_refill_loads_each_occurrence_once(self):
+        self.scheduler.refill(self.now)
+        count = len(self.scheduler)
+        self.scheduler.refill(self.now + timezone.timedelta(minutes=1))
+        self.assertEqual(len(self.scheduler), count)
+
+    def test_refill_query_count(self):
+        with self.assertNumQueries(1):
+            self.scheduler.refill(self.now)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fire_on_start(self, mock_dummy):
+        self.scheduler.run_pending(self.now)
+        mock_dummy.assert_not_called()
+
+        self.assertEqual(self.scheduler.run_pending(self.start), 1)
+        mock_dummy.assert_called_once()
+        self.assertEqual(
+            mock_dummy.call_args.kwargs['occurrence'],
+            (self.start, self.event.end + self.event.recurrence)
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.fired_start, self.start)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fire_once_with_fire_due(self, mock_dummy):
+        self.scheduler.run_pending(self.now)
+        self.scheduler.run_pending(self.start)
+
+        date = self.start + timezone.timedelta(minutes=30)
+        SubscriptionEvent.objects.all().advance(date)
+        fire_due(date)
+        mock_dummy.assert_called_once()
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_fired_occurrences_are_not_claimed(self, mock_dummy):
+        self.scheduler.run_pending(self.now)
+        SubscriptionEvent.objects.filter(pk=3).update(fired_start=self.start)
+        self.scheduler.run_pending(self.start)
+        mock_dummy.assert_not_called()
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_failed_fire_is_not_claimed(self, mock_dummy):
+        self.scheduler.run_pending(self.now)
+        with mock.patch('subscription.scheduler.fire', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.scheduler.run_pending(self.start)
+        self.event.refresh_from_db()
+        self.assertIsNone(self.event.fired_start)
+
+        date = self.start + timezone.timedelta(minutes=30)
+        SubscriptionEvent.objects.all().advance(date)
+        fire_due(date)
+        mock_dummy.assert_called_once()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.fired_start, self.start)
+
+    def test_timeout(self):
+        self.scheduler.run_pending(self.now)
+        self.assertEqual(self.scheduler.timeout(self.now), 60)
+        self.assertEqual(
+            self.scheduler.timeout(self.start - timezone.timedelta(seconds=10)), 0
+        )
@@ -1,6 +1,21 @@
-from django.test import TestCase
+from unittest import mock
+import asyncio
 
-from subscription.signals import callback_receiver, default_receiver
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, User
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from subscription.callbacks import callback_registry
+from subscription.models import Resource
+from subscription.routing import resource_index
+from subscription.signals import (
+    adispatch_instances, callback_receiver, default_receiver, merge_buffered
+)
+from subscription.tests.utils import ASYNC_DUMMY_DOTTED_PATH, DUMMY_DOTTED_PATH
+from subscription.tasks import dispatch_objects
+from subscription.wiring import signal_wiring
 
 
 class CallBackReceiverTestCase(TestCase):
@@ -8,4 +23,250 @@ class CallBackReceiverTestCase(TestCase):
 
 
 class DefaultReceiverTestCase(TestCase):
-    pass
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        self.resource = Resource.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+
+    def count_selects(self) -> int:
+        with CaptureQueriesContext(connection) as context:
+            default_receiver(sender=User, instance=self.user, created=False)
+        return len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        ])
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_callback_is_called(self, mock_dummy):
+        default_receiver(sender=User, instance=self.user, created=False)
+        mock_dummy.assert_called_once()
+        self.assertEqual(mock_dummy.call_args.kwargs['instance'], self.resource)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_unchanged_resources_are_not_written(self, _):
+        default_receiver(sender=User, instance=self.user, created=False)
+        with CaptureQueriesContext(connection) as context:
+            default_receiver(sender=User, instance=self.user, created=False)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ])
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_changed_resources_are_written_at_once(self, _):
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=self.resource.content_type,
+                object_pk=self.resource.object_pk,
+                subscription_event_id=self.resource.subscription_event_id,
+                content_object_fields=self.resource.content_object_fields,
+                callback=self.resource.callback
+            )
+            for _ in range(10)
+        ])
+        self.user.first_name = 'changed'
+        with CaptureQueriesContext(connection) as context:
+            default_receiver(sender=User, instance=self.user, created=False)
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if query['sql'].startswith('UPDATE')
+        ]), 1)
+        self.assertSetEqual({
+            resource.get_stored_values()['first_name']
+            for resource in Resource.objects.filter(content_type=self.resource.content_type)
+        }, {'changed'})
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_selects_do_not_depend_on_related_resources(self, mock_dummy):
+        resource_index.lookup(self.resource.content_type_id, self.user.pk)
+        expected = self.count_selects()
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=self.resource.content_type,
+                object_pk=self.resource.object_pk,
+                subscription_event_id=self.resource.subscription_event_id,
+                content_object_fields=self.resource.content_object_fields,
+                callback=self.resource.callback
+            )
+            for _ in range(10)
+        ])
+        resource_index.lookup(self.resource.content_type_id, self.user.pk)
+        self.assertEqual(self.count_selects(), expected)
+        self.assertEqual(mock_dummy.call_count, 12)
+
+
+@mock.patch('subscription.tasks.dispatch_objects.delay')
+class CeleryDispatchTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        dispatch = override_settings(SUBSCRIPTION_DISPATCH='celery')
+        dispatch.enable()
+        self.addCleanup(dispatch.disable)
+        signal_wiring.connect(User)
+        self.addCleanup(signal_wiring.disconnect, User)
+
+    def test_dispatch_after_commit(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch('subscription.tests.utils.dummy') as mock_dummy:
+                self.user.save()
+            mock_dummy.assert_not_called()
+            mock_delay.assert_not_called()
+        mock_delay.assert_called_once_with([[4, '1', False]])
+
+    def test_coalesce_saves(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            self.user.save()
+            User.objects.create(username='unwatched')
+        mock_delay.assert_called_once_with([[4, '1', False]])
+
+    def test_rollback_drops_saves(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.user.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        mock_delay.assert_not_called()
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_dispatch_objects(self, mock_dummy, _):
+        self.assertEqual(dispatch_objects([[4, '1', False], [4, '2', True]]), 1)
+        mock_dummy.assert_called_once()
+        self.assertFalse(mock_dummy.call_args.kwargs['created'])
+
+
+class CommitDispatchTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+        dispatch = override_settings(SUBSCRIPTION_DISPATCH='commit')
+        dispatch.enable()
+        self.addCleanup(dispatch.disable)
+        signal_wiring.connect(User)
+        self.addCleanup(signal_wiring.disconnect, User)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_coalesce_saves(self, mock_dummy):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                self.user.first_name = f'name-{i}'
+                self.user.save()
+            mock_dummy.assert_not_called()
+
+        mock_dummy.assert_called_once()
+        resource = Resource.objects.get(id=1)
+        self.assertEqual(resource.get_stored_values()['first_name'], 'name-4')
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_rollback_drops_saves(self, mock_dummy):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.user.save()
+                    raise ValueError
+            except ValueError:
+                pass
+        mock_dummy.assert_not_called()
+
+    @mock.patch('subscription.signals.dispatch_instances')
+    def test_created_flag_is_kept(self, mock_dispatch):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+            self.user.save()
+        mock_dispatch.assert_called_once_with(User, {'1': self.user}, pooled=True, created=False)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_savepoint_rollback_drops_saves(self, mock_dummy):
+        Resource.objects.filter(id=2).update(callback=DUMMY_DOTTED_PATH)
+        signal_wiring.connect(Group)
+        self.addCleanup(signal_wiring.disconnect, Group)
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.get(id=1).save()
+            try:
+                with transaction.atomic():
+                    self.user.first_name = 'rolled-back'
+                    self.user.save()
+                    raise ValueError
+            except ValueError:
+                pass
+
+        mock_dummy.assert_called_once()
+        self.assertEqual(mock_dummy.call_args.kwargs['instance'].pk, 2)
+        self.assertNotEqual(Resource.objects.get(id=1).get_stored_values()['first_name'], 'rolled-back')
+
+    def test_merge_buffered(self):
+        self.assertEqual(
+            merge_buffered((User, None, True), (User, self.user, False)),
+            (User, self.user, True)
+        )
+
+
+class AsyncDispatchTestCase(TestCase):
+    fixtures = ['auth.json', 'contenttypes.json', 'subscription.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.get(id=1)
+        self.resource = Resource.objects.get(id=1)
+        Resource.objects.filter(id=1).update(callback=ASYNC_DUMMY_DOTTED_PATH)
+        callback_registry.invalidate()
+        self.addCleanup(callback_registry.invalidate)
+
+    @mock.patch('subscription.tests.utils.adummy', new_callable=mock.AsyncMock)
+    def test_sync_receiver_awaits_async_callbacks(self, mock_adummy):
+        default_receiver(sender=User, instance=self.user, created=False)
+        mock_adummy.assert_awaited_once()
+
+    @mock.patch('subscription.tests.utils.adummy', new_callable=mock.AsyncMock)
+    @override_settings(SUBSCRIPTION_DISPATCH='async')
+    def test_async_dispatch(self, mock_adummy):
+        default_receiver(sender=User, instance=self.user, created=False)
+        mock_adummy.assert_awaited_once()
+        self.assertEqual(mock_adummy.call_args.kwargs['instance'].pk, 1)
+
+    @mock.patch('subscription.tests.utils.dummy')
+    def test_async_dispatch_runs_sync_callbacks(self, mock_dummy):
+        Resource.objects.filter(id=1).update(callback=DUMMY_DOTTED_PATH)
+        count = async_to_sync(adispatch_instances)(User, {'1': self.user}, created=False)
+        self.assertEqual(count, 1)
+        mock_dummy.assert_called_once()
+
+    def test_callbacks_run_concurrently(self):
+        Resource.objects.bulk_create([
+            Resource(
+                content_type=self.resource.content_type,
+                object_pk=self.resource.object_pk,
+                subscription_event_id=self.resource.subscription_event_id,
+                callback=ASYNC_DUMMY_DOTTED_PATH
+            )
+            for _ in range(4)
+        ])
+        state = {'waiting': 0}
+
+        async def wait(**kwargs):
+            # Created in the loop of async_to_sync, which runs in another thread.
+            ready = state.setdefault('ready', asyncio.Event())
+            state['waiting'] += 1
+            if state['waiting'] == 5:
+                ready.set()
+            await asyncio.wait_for(ready.wait(), timeout=5)
+
+        with mock.patch('subscription.tests.utils.adummy', side_effect=wait) as mock_adummy:
+            async_to_sync(adispatch_instances)(User, {'1': self.user}, created=False)
+        self.assertEqual(mock_adummy.call_count, 5)
+        self.assertEqual(state['waiting'], 5)
@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from subscription.transactions import TransactionBuffer
+
+
+class TransactionBufferTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flush = mock.Mock()
+        self.buffer = TransactionBuffer(self.flush, merge=lambda old, new: old + new)
+
+    def rollback(self, *items):
+        try:
+            with transaction.atomic():
+                for key, value in items:
+                    self.buffer.add(key, value)
+                raise ValueError
+        except ValueError:
+            pass
+
+    def test_flush_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.add('a', 1)
+            self.buffer.add('a', 2)
+            self.flush.assert_not_called()
+        self.flush.assert_called_once_with({'a': 3})
+
+    def test_flush_outside_of_transactions(self):
+        with mock.patch.object(transaction.get_connection(), 'in_atomic_block', False):
+            self.buffer.add('a', 1)
+        self.flush.assert_called_once_with({'a': 1})
+
+    def test_savepoint_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.buffer.add('a', 1)
+            self.rollback(('a', 10), ('b', 20))
+            with transaction.atomic():
+                self.buffer.add('c', 3)
+            self.buffer.add('a', 2)
+        self.flush.assert_called_once_with({'a': 3, 'c': 3})
+
+    def test_first_items_in_rolled_back_savepoint(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rollback(('a', 1))
+            self.buffer.add('b', 2)
+        self.flush.assert_called_once_with({'b': 2})
+
+    def test_everything_rolled_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rollback(('a', 1))
+        self.flush.assert_not_called()
@@ -6,6 +6,7 @@ from typing import Optional, List
 logger = logging.getLogger(__name__)
 
 DUMMY_DOTTED_PATH = 'subscription.tests.utils.dummy'
+ASYNC_DUMMY_DOTTED_PATH = 'subscription.tests.utils.adummy'
 
 
 def dummy(*args, **kwargs) -> None:
@@ -16,6 +17,13 @@ def dummy(*args, **kwargs) -> None:
     pprint(kwargs)
 
 
+async def adummy(*args, **kwargs) -> None:
+    """
+    Set this coroutine function as your resource callback.
+    """
+    logger.info(f'kwargs: {kwargs}')
+
+
 def split_path(path: str, items: List[str]) -> Optional[List[str]]:
     """
     Function that breaks out all of the parts of a file or directory
@@ -0,0 +1,99 @@
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import threading
+
+from django.db import transaction
+
+Merge = Callable[[object, object], object]
+
+
+class Segment:
+    """
+    Marks the items added to a buffer within a savepoint. It is
+    registered as an on_commit callback, which Django discards if the
+    savepoint is rolled back, so it is only called if the items it
+    marks have been committed.
+    """
+    def __init__(self):
+        self.committed = False
+
+    def __call__(self):
+        self.committed = True
+
+
+class TransactionBuffer:
+    """
+    Collects items per transaction and hands them to flush once the
+    transaction is committed. Items added with the same key are merged,
+    and the items of a transaction that is rolled back are dropped along
+    with its on_commit callbacks, as are the items added within a
+    savepoint that is rolled back. Outside of a transaction each item is
+    flushed right away.
+    """
+    def __init__(
+            self,
+            flush: Callable[[Dict[Hashable, object]], None],
+            merge: Optional[Merge] = None
+    ):
+        self.flush = flush
+        self.merge = merge or (lambda old, new: new)
+        self._local = threading.local()
+
+    def pending(self, using: Optional[str] = None) -> Optional[Tuple[Callable, List, Dict]]:
+        """
+        Returns the flush callback of the current transaction, with the
+        items added so far and the segments marking them, as long as
+        the callback has not been discarded by a rollback.
+
+        :param using:
+        :return:
+        """
+        connection = transaction.get_connection(using)
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or not connection.in_atomic_block:
+            return None
+
+        # run_on_commit holds (savepoint ids, callback, robust) tuples.
+        if any(entry[1] is buffer[0] for entry in connection.run_on_commit):
+            return buffer
+
+    def add(self, key: Hashable, value: object, using: Optional[str] = None) -> None:
+        """
+        Adds an item to the buffer of the current transaction. The flush
+        callback is kept after the segments in the on_commit callbacks,
+        so it runs once they have marked which items were committed.
+
+        :param key:
+        :param value:
+        :param using:
+        :return:
+        """
+        connection = transaction.get_connection(using)
+        if not connection.in_atomic_block:
+            self.flush({key: value})
+            return
+
+        buffer = self.pending(using)
+        if buffer is None:
+            entries, segments = [], {}
+
+            def callback():
+                self._local.buffer = None
+                items = {}
+                for segment, key, value in entries:
+                    if segment.committed:
+                        items[key] = self.merge(items[key], value) if key in items else value
+                if items:
+                    self.flush(items)
+
+            buffer = self._local.buffer = (callback, entries, segments)
+            transaction.on_commit(callback, using=using)
+
+        callback, entries, segments = buffer
+        sids = tuple(connection.savepoint_ids)
+        if sids not in segments:
+            segments[sids] = Segment()
+            transaction.on_commit(segments[sids], using=using)
+            index = next(i for i, entry in enumerate(connection.run_on_commit) if entry[1] is callback)
+            connection.run_on_commit.append(connection.run_on_commit.pop(index))
+
+        entries.append((segments[sids], key, value))
@@ -2,7 +2,8 @@ from django.utils.deconstruct import deconstructible
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext as _
-from django.utils.module_loading import import_string
+
+from .callbacks import callback_registry, RESOLUTION_ERRORS
 
 
 @deconstructible
@@ -13,12 +14,12 @@ class ImportCallBackValidator(object):
     def __call__(self, value: str) -> None:
         try:
             if value:
-                obj = import_string(value)
+                obj = callback_registry.resolve(value)
                 if not callable(obj):
                     raise ValidationError(
                         _(f'{obj} object is not callable')
                     )
-        except (ModuleNotFoundError, ImportError, TypeError, AttributeError, ValueError) as e:
+        except RESOLUTION_ERRORS as e:
             raise ValidationError(
                 self.message.format(value)
             )
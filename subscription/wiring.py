@@ -0,0 +1,260 @@
+from typing import Callable, Iterable, Optional, Set, Type
+import logging
+import threading
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, models, router, transaction
+from django.db.models.signals import post_migrate, post_save, post_delete, ModelSignal
+from django.dispatch import receiver
+
+from .bulk import defer_routing
+from .signals import changes_routing, default_receiver
+
+logger = logging.getLogger(__name__)
+
+
+class SignalWiring:
+    """
+    Dispatches the signal of the models related to active resources to
+    the receiver. A single dispatcher is connected to the signal for
+    every sender, and the watched models are kept in a set, so watching
+    or unwatching a model is a set operation and the signal of any
+    other model costs one membership test.
+
+    Nothing is queried until the wiring is first used: the related
+    models are then loaded with a single query, and later kept up to
+    date one content type at a time as resources change.
+    """
+    def __init__(
+            self,
+            signal: ModelSignal = post_save,
+            receiver: Callable = default_receiver
+    ):
+        self.signal = signal
+        self.receiver = receiver
+        self.loaded = False
+        self.migrating = False
+        self.duration: Optional[float] = None
+        self._connected: Set[Type[models.Model]] = set()
+        self._lock = threading.RLock()
+        self.dispatch_uid = f'{__name__}.{id(self)}'
+        self.signal.connect(self.dispatch, weak=False, dispatch_uid=self.dispatch_uid)
+        post_migrate.connect(self.migrated, weak=False, dispatch_uid=self.dispatch_uid)
+
+    @property
+    def connected(self) -> Set[Type[models.Model]]:
+        return set(self._connected)
+
+    def watches(self, model_class: Type[models.Model]) -> bool:
+        """
+        Checks if the receiver is connected to the model, setting up
+        the wiring on first use, so saves outside of a request (Celery
+        tasks, management commands, shell sessions) are dispatched too.
+
+        :param model_class:
+        :return:
+        """
+        self.setup()
+        return model_class in self._connected
+
+    def dispatch(self, sender: Type[models.Model], **kwargs) -> None:
+        if not kwargs.get('raw') and self.watches(sender):
+            self.receiver(sender=sender, **kwargs)
+
+    def handles(self, signal: ModelSignal, receiver: Callable) -> bool:
+        """
+        Checks if signal and receiver are the ones dispatched by the
+        wiring.
+
+        :param signal:
+        :param receiver:
+        :return:
+        """
+        return signal is self.signal and receiver is self.receiver
+
+    def connect(self, model_class: Type[models.Model]) -> None:
+        with self._lock:
+            self._connected = self._connected | {model_class}
+
+    def disconnect(self, model_class: Type[models.Model]) -> bool:
+        with self._lock:
+            connected = model_class in self._connected
+            self._connected = self._connected - {model_class}
+            return connected
+
+    def setup(self) -> None:
+        """
+        Connects the receiver to every model related to an active
+        resource, once per process. The time spent is kept in duration
+        and logged. If the resource table does not exist yet, as while
+        the database is being migrated, nothing is watched until the
+        migration is over; after any other error it is tried again on
+        next use.
+
+        :return:
+        """
+        if self.loaded or self.migrating:
+            return
+
+        with self._lock:
+            if self.loaded or self.migrating:
+                return
+
+            from .models import Resource
+
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    related_models = Resource.objects.related_models()
+            except DatabaseError:
+                if not self.table_exists(Resource):
+                    self.migrating = True
+                    logger.info(f'Signal {self.signal}: resources will be loaded once migrated')
+                else:
+                    logger.warning(f'Signal {self.signal}: resources could not be loaded', exc_info=True)
+                return
+            for model_class in related_models:
+                self.connect(model_class)
+            self.duration = time.perf_counter() - started
+            self.loaded = True
+
+        logger.info(
+            f'Signal {self.signal}: {len(self._connected)} models connected '
+            f'in {self.duration * 1000:.1f}ms'
+        )
+
+    def table_exists(self, model_class: Type[models.Model]) -> bool:
+        """
+        Checks if the table of the model exists, assuming it does if the
+        database cannot tell.
+
+        :param model_class:
+        :return:
+        """
+        connection = transaction.get_connection(router.db_for_read(model_class))
+        try:
+            return model_class._meta.db_table in connection.introspection.table_names()
+        except DatabaseError:
+            return True
+
+    def migrated(self, **kwargs) -> None:
+        """
+        Lets the wiring be set up on next use once the database has been
+        migrated.
+
+        :param kwargs:
+        :return:
+        """
+        self.migrating = False
+
+    def refresh(self, content_type_ids: Iterable[int]) -> None:
+        """
+        Connects the models of the content types that have active
+        resources. The others are disconnected once the transaction is
+        committed, if they still have none by then, so that a rollback
+        never leaves a watched model disconnected.
+
+        :param content_type_ids:
+        :return:
+        """
+        content_type_ids = set(content_type_ids)
+        if not self.loaded or not content_type_ids:
+            return
+
+        unused = content_type_ids - self.used(content_type_ids)
+        for content_type_id in content_type_ids - unused:
+            self.connect(ContentType.objects.get_for_id(content_type_id).model_class())
+
+        if unused:
+            transaction.on_commit(lambda: self.release(unused))
+
+    def release(self, content_type_ids: Iterable[int]) -> None:
+        """
+        Disconnects the models of the content types without active
+        resources.
+
+        :param content_type_ids:
+        :return:
+        """
+        content_type_ids = set(content_type_ids)
+        for content_type_id in content_type_ids - self.used(content_type_ids):
+            self.disconnect(ContentType.objects.get_for_id(content_type_id).model_class())
+
+    def used(self, content_type_ids: Iterable[int]) -> Set[int]:
+        """
+        Returns the content types, among the given ones, that have
+        active resources.
+
+        :param content_type_ids:
+        :return:
+        """
+        from .models import Resource
+
+        return set(
+            Resource.objects.all().active().filter(
+                content_type_id__in=content_type_ids
+            ).values_list('content_type_id', flat=True).distinct()
+        )
+
+    def reset(self) -> None:
+        """
+        Disconnects every model and loads them again on next use.
+
+        :return:
+        """
+        with self._lock:
+            self._connected = set()
+            self.loaded = False
+            self.migrating = False
+            self.duration = None
+
+
+signal_wiring = SignalWiring()
+
+
+@receiver(post_save, sender='subscription.Resource')
+@receiver(post_delete, sender='subscription.Resource')
+def resource_wiring_receiver(sender: Type[models.Model], instance, **kwargs) -> None:
+    """
+    Connects or disconnects the model related to a resource when the
+    resource is activated, deactivated, created or deleted, unless the
+    refresh is deferred to the end of a bulk delete.
+
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    if not changes_routing(sender, kwargs.get('update_fields')):
+        return
+    if defer_routing(instance.content_type_id):
+        return
+
+    signal_wiring.refresh([instance.content_type_id])
+
+
+@receiver(post_save, sender='subscription.Subscription')
+def subscription_wiring_receiver(sender: Type[models.Model], instance, **kwargs) -> None:
+    """
+    Refreshes the models related to the resources of a subscription
+    when it is saved, as it may have been activated or deactivated.
+
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    update_fields = kwargs.get('update_fields')
+    if not signal_wiring.loaded or (
+            update_fields is not None and 'active' not in update_fields
+    ):
+        return
+
+    from .models import Resource
+
+    signal_wiring.refresh(
+        Resource.objects.filter(
+            subscription_event__subscription_line__subscription=instance
+        ).values_list('content_type_id', flat=True).distinct()
+    )